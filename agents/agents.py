@@ -1,19 +1,56 @@
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 
+from utils import markdown_sections, metrics
+from utils.diff_utils import estimate_tokens
+from utils.llm_cache import open_llm_cache
 from agents.prompts import (
     STRICT_SYSTEM_PROMPT,
     AUDIT_PROMPT,
     INTEGRATION_PROMPT,
     REVIEW_PROMPT,
-    CHANGELOG_PROMPT
+    CHANGELOG_PROMPT,
+    DIFF_SUMMARY_PROMPT,
+    FILE_SUMMARY_PROMPT,
+    DIRECTORY_SUMMARY_PROMPT,
+    SECTION_PATCH_PROMPT,
+    NEW_SECTION_PROMPT
 )
 
 load_dotenv()
 
-llm = ChatOllama(model="llama3.1:latest", temperature=0.1)
+LLM_MODEL = "llama3.1:latest"
+
+# Created on first use, so importing this module doesn't build an Ollama client.
+llm = None
+
+def get_llm():
+    global llm
+    if llm is None:
+        llm = ChatOllama(model=LLM_MODEL, temperature=0.1)
+    return llm
+
+# Set AGENT_QUIET=1 (or call set_echo(False)) to skip per-token terminal output, e.g. under the scheduler.
+ECHO = os.getenv("AGENT_QUIET", "").lower() not in ("1", "true", "yes")
+
+def set_echo(enabled):
+    global ECHO
+    ECHO = enabled
+
+_response_cache = None
+_response_cache_opened = False
+
+def get_response_cache():
+    """Disk-backed response cache shared by every chain call (None if disabled)."""
+    global _response_cache, _response_cache_opened
+    if not _response_cache_opened:
+        _response_cache = open_llm_cache()
+        _response_cache_opened = True
+    return _response_cache
 
 def clean_response(text):
     """
@@ -57,63 +94,226 @@ def clean_response(text):
         
     return "\n".join(clean_lines).strip()
 
-def run_stream(chain, inputs):
+def _build_chain(system_prompt, human_template):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", human_template)
+    ])
+    return prompt | get_llm()
+
+def _echo_enabled(echo):
+    return ECHO if echo is None else echo
+
+def _cache_key(chain, inputs):
+    model = chain.last
+    messages = chain.first.format_messages(**inputs)
+    return get_response_cache().make_key(messages, model.model, model.temperature)
+
+def _cached(chain, inputs):
+    """Returns (key, cached text). Key is None when the cache is disabled."""
+    if get_response_cache() is None:
+        return None, None
+    key = _cache_key(chain, inputs)
+    text = get_response_cache().get(key)
+    if text is not None:
+        print("   ↺ Reusing cached response.")
+        metrics.count(llm_cache_hits=1)
+    return key, text
+
+def _remember(key, text):
+    if key is not None and text.strip():
+        get_response_cache().set(key, text)
+
+def _record_usage(chain, inputs, usage, text, start):
+    """Token counts from Ollama's usage metadata, estimated when the model reports none."""
+    if usage:
+        prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    else:
+        prompt_tokens = sum(estimate_tokens(m.content) for m in chain.first.format_messages(**inputs))
+        completion_tokens = estimate_tokens(text)
+    metrics.record_llm(prompt_tokens, completion_tokens, time.perf_counter() - start)
+
+def run_stream(chain, inputs, echo=None):
     """Runs the chain with live terminal output, returning cleaned string."""
-    full_response = ""
+    key, cached = _cached(chain, inputs)
+    if cached is not None:
+        return clean_response(cached)
+
+    start = time.perf_counter()
+    if not _echo_enabled(echo):
+        response = chain.invoke(inputs)
+        text = response.content
+        _record_usage(chain, inputs, response.usage_metadata, text, start)
+        _remember(key, text)
+        return clean_response(text)
+
+    chunks = []
+    usage = None
     print("\033[96m   > \033[0m", end="", flush=True) 
     
     for chunk in chain.stream(inputs):
         content = chunk.content
         print(content, end="", flush=True)
-        full_response += content
+        chunks.append(content)
+        usage = chunk.usage_metadata or usage
         
     print("\n")
-    return clean_response(full_response)
+    text = "".join(chunks)
+    _record_usage(chain, inputs, usage, text, start)
+    _remember(key, text)
+    return clean_response(text)
+
+async def arun_stream(chain, inputs, echo=None):
+    """Async run_stream: several of these can be in flight at once on one event loop."""
+    key, cached = _cached(chain, inputs)
+    if cached is not None:
+        return clean_response(cached)
+
+    start = time.perf_counter()
+    if not _echo_enabled(echo):
+        response = await chain.ainvoke(inputs)
+        _record_usage(chain, inputs, response.usage_metadata, response.content, start)
+        _remember(key, response.content)
+        return clean_response(response.content)
+
+    chunks = []
+    usage = None
+    print("\033[96m   > \033[0m", end="", flush=True)
+
+    async for chunk in chain.astream(inputs):
+        print(chunk.content, end="", flush=True)
+        chunks.append(chunk.content)
+        usage = chunk.usage_metadata or usage
+
+    print("\n")
+    text = "".join(chunks)
+    _record_usage(chain, inputs, usage, text, start)
+    _remember(key, text)
+    return clean_response(text)
 
 # --- AGENT FUNCTIONS ---
 
+def _fresh_readme_chain():
+    return _build_chain(STRICT_SYSTEM_PROMPT, "Context:\n{context}\n\nTask: Write full README.")
+
+def _audit_chain():
+    return _build_chain(AUDIT_PROMPT, "README:\n{readme}\n\nCODE:\n{code}")
+
+def _integration_chain():
+    return _build_chain(INTEGRATION_PROMPT, "README:\n{readme}\n\nMISSING:\n{missing}")
+
+def _review_chain():
+    return _build_chain(REVIEW_PROMPT, "Draft:\n{draft}")
+
+def _changelog_chain():
+    return _build_chain(CHANGELOG_PROMPT, "DIFF:\n{diff}")
+
+def _diff_summary_chain():
+    return _build_chain(DIFF_SUMMARY_PROMPT, "DIFF:\n{diff}")
+
+def _file_summary_chain():
+    return _build_chain(FILE_SUMMARY_PROMPT, "FILE: {path}\n\n{content}")
+
+def _directory_summary_chain():
+    return _build_chain(DIRECTORY_SUMMARY_PROMPT, "DIRECTORY: {path}\n\n{listing}")
+
+def _section_patch_chain():
+    return _build_chain(SECTION_PATCH_PROMPT, "HEADING:\n{heading}\n\nBODY:\n{body}\n\nMISSING:\n{missing}")
+
+def _new_section_chain():
+    return _build_chain(NEW_SECTION_PROMPT, "HEADING:\n{heading}\n\nITEMS:\n{missing}")
+
 def draft_fresh_readme(context):
     print("Agent: Drafting fresh README...")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", STRICT_SYSTEM_PROMPT),
-        ("human", "Context:\n{context}\n\nTask: Write full README.")
-    ])
-    chain = prompt | llm
-    return run_stream(chain, {"context": context})
+    return run_stream(_fresh_readme_chain(), {"context": context})
 
 def audit_readme(current_readme, code_reality):
     print("Agent: Auditing for gaps...")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", AUDIT_PROMPT),
-        ("human", "README:\n{readme}\n\nCODE:\n{code}")
-    ])
-    chain = prompt | llm
-    return run_stream(chain, {"readme": current_readme, "code": code_reality})
+    return run_stream(_audit_chain(), {"readme": current_readme, "code": code_reality})
 
 def integrate_changes(current_readme, missing_features):
     print("Agent: Integrating new features...")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", INTEGRATION_PROMPT),
-        ("human", "README:\n{readme}\n\nMISSING:\n{missing}")
-    ])
-    chain = prompt | llm
-    return run_stream(chain, {"readme": current_readme, "missing": missing_features})
+    return run_stream(_integration_chain(), {"readme": current_readme, "missing": missing_features})
 
 def review_content(text):
     print("Reviewer: Polishing text...")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", REVIEW_PROMPT),
-        ("human", "Draft:\n{draft}")
-    ])
-    chain = prompt | llm
-    return run_stream(chain, {"draft": text})
+    return run_stream(_review_chain(), {"draft": text})
 
 def generate_changelog(diff_text):
     if not diff_text: return None
     print("Historian: summarizing diff...")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", CHANGELOG_PROMPT),
-        ("human", "DIFF:\n{diff}")
-    ])
-    chain = prompt | llm
-    return run_stream(chain, {"diff": diff_text})
+    return run_stream(_changelog_chain(), {"diff": diff_text})
+
+def summarize_file(path, content):
+    """One-sentence summary for the repo overview. Never echoed."""
+    return run_stream(_file_summary_chain(), {"path": path, "content": content}, echo=False)
+
+def summarize_directory(path, listing):
+    return run_stream(_directory_summary_chain(), {"path": path, "listing": listing}, echo=False)
+
+# --- ASYNC AGENT FUNCTIONS ---
+
+async def adraft_fresh_readme(context):
+    print("Agent: Drafting fresh README...")
+    return await arun_stream(_fresh_readme_chain(), {"context": context})
+
+async def aaudit_readme(current_readme, code_reality):
+    print("Agent: Auditing for gaps...")
+    return await arun_stream(_audit_chain(), {"readme": current_readme, "code": code_reality})
+
+async def aintegrate_changes(current_readme, missing_features):
+    print("Agent: Integrating new features...")
+    return await arun_stream(_integration_chain(), {"readme": current_readme, "missing": missing_features})
+
+async def areview_content(text):
+    print("Reviewer: Polishing text...")
+    return await arun_stream(_review_chain(), {"draft": text})
+
+async def agenerate_changelog(diff_text):
+    if not diff_text: return None
+    print("Historian: summarizing diff...")
+    return await arun_stream(_changelog_chain(), {"diff": diff_text})
+
+async def asummarize_diff_group(diff_text):
+    """Map step for big diffs: a short summary of one group of file patches. Never echoed."""
+    return await arun_stream(_diff_summary_chain(), {"diff": diff_text}, echo=False)
+
+async def apatch_readme(current_readme, missing_features):
+    """
+    Regenerates only the README sections the audit's items belong to (concurrently)
+    and splices them back; the rest of the file is untouched. Falls back to
+    the full-document integration when the audit output has no list items.
+    """
+    patches, additions = markdown_sections.plan_patches(current_readme, missing_features)
+    if not patches and not additions:
+        return await aintegrate_changes(current_readme, missing_features)
+
+    print(f"Agent: Patching {len(patches)} section(s), adding {len(additions)}...")
+    # Several streams at once would interleave on the terminal.
+    echo = None if len(patches) + len(additions) == 1 else False
+    level = "#" * markdown_sections.heading_level(current_readme)
+    headings = [f"{level} {markdown_sections.SECTION_TITLES.get(key, key.title())}" for key, _ in additions]
+
+    def bullets(items):
+        return "\n".join(f"- {i}" for i in items)
+
+    bodies = await asyncio.gather(
+        *(arun_stream(_section_patch_chain(), {
+            "heading": current_readme[s.start:s.body_start].strip(),
+            "body": current_readme[s.body_start:s.end].strip("\n"),
+            "missing": bullets(items),
+        }, echo) for s, items in patches),
+        *(arun_stream(_new_section_chain(), {"heading": h, "missing": bullets(items)}, echo)
+          for h, (_, items) in zip(headings, additions)),
+    )
+
+    def leading_newlines(s):
+        body = current_readme[s.body_start:s.end]
+        return body[:len(body) - len(body.lstrip("\n"))]
+
+    replacements = [
+        (s, current_readme[s.start:s.body_start] + leading_newlines(s) + body)
+        for (s, _), body in zip(patches, bodies) if body.strip()
+    ]
+    appended = [f"{h}\n\n{body}" for h, body in zip(headings, bodies[len(patches):]) if body.strip()]
+    return markdown_sections.splice(current_readme, replacements, appended)
@@ -64,4 +64,38 @@ Task: Fix grammar and formatting. Return ONLY the markdown content.
 
 CHANGELOG_PROMPT = """Summarize this git diff into a single one-line changelog entry.
 Format: "- **[Category]** Description"
-"""
\ No newline at end of file
+"""
+
+DIFF_SUMMARY_PROMPT = """Summarize the changes in this part of a larger git diff.
+Output 1-3 short bullet points describing WHAT changed and WHY it matters.
+No preamble, no code.
+"""
+
+FILE_SUMMARY_PROMPT = """Summarize what this source file does in ONE sentence (max 30 words).
+Mention its main classes, functions, commands or settings by name.
+No preamble.
+"""
+
+DIRECTORY_SUMMARY_PROMPT = """Below are one-line summaries of the entries in a directory of a code repository.
+Summarize what this directory is responsible for in ONE or TWO sentences (max 50 words).
+No preamble.
+"""
+
+SECTION_PATCH_PROMPT = """You are a Documentation Repair Engine.
+Task: Update ONE section of a README so it covers the MISSING items.
+
+INSTRUCTIONS:
+1. You get the section's heading and its current BODY (the text under the heading).
+2. Output ONLY the updated body. Do NOT repeat the heading.
+3. Keep every existing line exactly as it is; add the missing items in the same style (e.g. as new bullets).
+4. Do NOT add other sections, "Recent Updates" or "Changelog".
+"""
+
+NEW_SECTION_PROMPT = """You are a Documentation Repair Engine.
+Task: Write the body of a new README section with the given heading, covering the listed items.
+
+INSTRUCTIONS:
+1. Output ONLY the body. Do NOT write the heading.
+2. For Contributing: standard Fork/Branch/PR text. For License: standard MIT text if unknown.
+3. Be concise and match ordinary README style.
+"""
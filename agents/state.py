@@ -2,10 +2,18 @@ from typing import TypedDict, List, Any
 
 
 class AgentState(TypedDict):
-    repo: Any
-    retriever: Any
+    # Everything here is checkpointed, so it must stay serializable:
+    # the PyGithub repo is passed in config["configurable"]["repo"] instead.
+    head_sha: str
+    fetch_mode: str
+    local_repo_path: str
+    base_sha: str
+    commit_range: dict
+    change_kind: str
     latest_diff: str
-    current_readme: str
+    current_readme: str  # None when the repo has no README (the writer drafts one)
+    repo_overview: str
+    current_changelog: str  # None until setup (or the packager) fetched it
     
     code_reality: str
     missing_features: str
@@ -17,3 +25,4 @@ class AgentState(TypedDict):
     final_readme: str
     changelog_entry: str
     file_updates: List[dict]
+    run_started_at: float
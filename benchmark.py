@@ -0,0 +1,416 @@
+"""
+Offline benchmark: fake GitHub repo, fake ChatOllama and fake embeddings, so
+fetch, chunking, indexing, every graph node and whole runs can be timed
+without a token or an Ollama server.
+
+    python benchmark.py --sizes 10,100,1000,10000 --output benchmark_results.json
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Must be set before the agent modules read them.
+os.environ["AGENT_QUIET"] = "1"
+os.environ["GITHUB_HTTP_CACHE"] = "0"
+os.environ["REPO_SOURCE"] = "tree"
+
+from github import GithubException
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import graph
+import main
+from agents import agents
+from agents.prompts import AUDIT_PROMPT, CHANGELOG_PROMPT
+from utils import chunking, github_utils, index_store, metrics, rag_utils, summaries
+from utils.embedding_cache import open_embedding_cache
+
+FAKE_README = """# Synthetic Project
+
+## Overview
+
+A generated repository used for benchmarking.
+
+## Key Features
+
+* Generated modules
+
+## Installation
+
+```bash
+pip install -e .
+```
+
+## License
+
+MIT
+"""
+
+AUDIT_REPLY = """- **Usage**: explain how to run the entry point
+- **Synthetic feature**: generated modules expose many small functions
+- **Configuration**: document the environment variables"""
+
+CHANGELOG_REPLY = "- **[Feature]** Synthetic change for benchmarking"
+
+
+# --- Fake GitHub -----------------------------------------------------------
+
+def _sha(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _module_source(index, functions=8, extra=0):
+    parts = [f'"""Synthetic module {index}."""\nimport os\n\nSETTING_{index} = os.getenv("SETTING_{index}", "{index}")\n']
+    for j in range(functions + extra):
+        parts.append(
+            f"\n\ndef func_{index}_{j}(value, scale={j + 1}):\n"
+            f'    """Returns value scaled by {j + 1}, used by module {index}."""\n'
+            f"    result = value * scale\n"
+            f"    if result > {index * 10 + j}:\n"
+            f"        return result - {j}\n"
+            f"    return result\n"
+        )
+    return "".join(parts)
+
+def _module_path(index):
+    return f"pkg{index % 10}/sub{index // 10 % 10}/module_{index}.py"
+
+
+class FakeRepository:
+    """
+    Just enough of PyGithub's Repository for the agent: git trees/blobs, compare,
+    contents, and the Git Data calls the publisher makes. Two commits: base and head,
+    where head changes `diff_files` modules by `diff_functions` added functions each.
+    """
+
+    def __init__(self, n_files, diff_files=5, diff_functions=2, api_latency=0.0):
+        self.full_name = f"bench/synthetic-{n_files}"
+        self.default_branch = "main"
+        self.api_latency = api_latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        base = {"README.md": FAKE_README, "CHANGELOG.md": "# Changelog\n\n"}
+        base.update({_module_path(i): _module_source(i) for i in range(n_files)})
+        head = dict(base)
+        self.changed = [_module_path(i) for i in range(min(diff_files, n_files))]
+        for i, path in enumerate(self.changed):
+            head[path] = _module_source(i, extra=diff_functions)
+
+        self.base_sha, self.head_sha = _sha(f"base{n_files}"), _sha(f"head{n_files}")
+        self.snapshots = {self.base_sha: base, self.head_sha: head}
+        self.blobs = {_sha(text): text for snapshot in self.snapshots.values() for text in snapshot.values()}
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def _commit(self, sha):
+        files = []
+        if sha == self.head_sha:
+            for path in self.changed:
+                before, after = self.snapshots[self.base_sha][path], self.snapshots[self.head_sha][path]
+                added = after[len(before):].splitlines()
+                patch = "@@ -1 +1 @@\n" + "\n".join("+" + line for line in added)
+                files.append(SimpleNamespace(filename=path, status="modified", additions=len(added), deletions=0, patch=patch))
+        return SimpleNamespace(sha=sha, commit=SimpleNamespace(message="feat: synthetic change"), files=files)
+
+    def get_branch(self, name):
+        self._call("get_branch")
+        return SimpleNamespace(commit=SimpleNamespace(sha=self.head_sha))
+
+    def get_git_tree(self, sha, recursive=False):
+        self._call("get_git_tree")
+        entries = [
+            SimpleNamespace(path=path, type="blob", size=len(text), sha=_sha(text))
+            for path, text in self.snapshots[sha].items()
+        ]
+        return SimpleNamespace(sha=sha, tree=entries, truncated=False)
+
+    def get_git_blob(self, sha):
+        self._call("get_git_blob")
+        return SimpleNamespace(content=base64.b64encode(self.blobs[sha].encode("utf-8")).decode(), encoding="base64")
+
+    def get_readme(self, ref=None):
+        self._call("get_readme")
+        return SimpleNamespace(decoded_content=self.snapshots[ref or self.head_sha]["README.md"].encode("utf-8"))
+
+    def get_contents(self, path, ref=None):
+        self._call("get_contents")
+        text = self.snapshots[ref or self.head_sha].get(path)
+        if text is None:
+            raise GithubException(404, {"message": "Not Found"}, None)
+        return SimpleNamespace(decoded_content=text.encode("utf-8"))
+
+    def compare(self, base, head):
+        self._call("compare")
+        commit = self._commit(head)
+        return SimpleNamespace(files=commit.files, commits=[commit])
+
+    def get_commit(self, sha):
+        self._call("get_commit")
+        return self._commit(sha)
+
+    def get_commits(self):
+        self._call("get_commits")
+        return [self._commit(self.head_sha)]
+
+    def get_git_commit(self, sha):
+        self._call("get_git_commit")
+        return SimpleNamespace(sha=sha, tree=SimpleNamespace(sha=sha))
+
+    def create_git_tree(self, elements, base_tree=None):
+        self._call("create_git_tree")
+        return SimpleNamespace(sha=_sha(repr(elements)))
+
+    def create_git_commit(self, message, tree, parents):
+        self._call("create_git_commit")
+        return SimpleNamespace(sha=_sha(message + tree.sha))
+
+    def create_git_ref(self, ref, sha):
+        self._call("create_git_ref")
+
+    def create_pull(self, title, body, head, base):
+        self._call("create_pull")
+        return SimpleNamespace(html_url=f"https://github.com/{self.full_name}/pull/1")
+
+
+class FakeGithub:
+    def __init__(self, repo):
+        self.repo = repo
+
+    def get_repo(self, name):
+        return self.repo
+
+
+# --- Fake models -----------------------------------------------------------
+
+class FakeChatOllama(BaseChatModel):
+    """Deterministic replies, paced at `tokens_per_sec` (one word = one token)."""
+
+    model: str = "fake-llama"
+    temperature: float = 0.1
+    tokens_per_sec: float = 200.0
+    response_tokens: int = 80
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-ollama"
+
+    def _reply(self, messages):
+        system = messages[0].content
+        if system == AUDIT_PROMPT:
+            return AUDIT_REPLY
+        if system == CHANGELOG_PROMPT:
+            return CHANGELOG_REPLY
+        seed = hashlib.sha256(messages[-1].content.encode("utf-8")).hexdigest()
+        return " ".join(f"word{seed[i % 60:i % 60 + 4]}" for i in range(self.response_tokens))
+
+    def _result(self, text):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(len(text.split()) / self.tokens_per_sec)
+        return self._result(text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        await asyncio.sleep(len(text.split()) / self.tokens_per_sec)
+        return self._result(text)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self._reply(messages).split(" "):
+            time.sleep(1 / self.tokens_per_sec)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self._reply(messages).split(" "):
+            await asyncio.sleep(1 / self.tokens_per_sec)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+class FakeEmbeddings(Embeddings):
+    """Hash-derived unit vectors; `seconds_per_text` simulates model latency."""
+
+    def __init__(self, size=64, seconds_per_text=0.0):
+        self.size = size
+        self.seconds_per_text = seconds_per_text
+        self.batches = 0
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        raw = [digest[i % len(digest)] / 255.0 - 0.5 for i in range(self.size)]
+        norm = sum(v * v for v in raw) ** 0.5 or 1.0
+        return [v / norm for v in raw]
+
+    def embed_documents(self, texts):
+        self.batches += 1
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# --- Harness ---------------------------------------------------------------
+
+def _isolate(tmp, args):
+    """Points every cache and the vector DB into `tmp` and installs the fakes."""
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tmp, "llm_responses.sqlite")
+    os.environ["SUMMARY_CACHE_PATH"] = os.path.join(tmp, "summaries.sqlite")
+    rag_utils.DB_PATH = os.path.join(tmp, "chroma_db")
+    index_store.INDEX_STORE_DIR = os.path.join(tmp, "indexes")
+    embeddings = FakeEmbeddings(seconds_per_text=args.embed_ms / 1000)
+    rag_utils._embeddings = open_embedding_cache(embeddings, "fake-embed")
+    agents.llm = FakeChatOllama(tokens_per_sec=args.tokens_per_sec, response_tokens=args.response_tokens)
+    agents._response_cache, agents._response_cache_opened = None, False
+    summaries.REPO_SUMMARIES = args.summaries
+    metrics.TRACE_FILE = os.path.join(tmp, "trace.jsonl")
+    metrics.PROM_DIR = tmp
+    return embeddings
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 4)
+
+def bench_index(n_files, args):
+    """Fetch, chunking and index_codebase cold / warm / incremental for one repo size."""
+    repo = FakeRepository(n_files, args.diff_files, args.diff_functions, args.api_ms / 1000)
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp, _quiet(args.verbose):
+        embeddings = _isolate(tmp, args)
+        base_docs, result["fetch_s"] = _timed(github_utils.fetch_repo_file_structure, repo, mode="tree", ref=repo.base_sha)
+        result["fetch_api_calls"] = dict(repo.calls)
+        result["documents"] = len(base_docs)
+
+        chunks, result["chunk_s"] = _timed(
+            lambda: [c for d in base_docs for c in chunking.split_file(d['source'], d['content'])]
+        )
+        result["chunks"] = len(chunks)
+
+        _, result["index_cold_s"] = _timed(rag_utils.index_codebase, base_docs, repo.base_sha)
+        result["embed_batches_cold"] = embeddings.batches
+        _, result["index_warm_s"] = _timed(rag_utils.index_codebase, base_docs, repo.base_sha)
+
+        head_docs = github_utils.fetch_repo_file_structure(repo, mode="tree", ref=repo.head_sha)
+        batches = embeddings.batches
+        _, result["index_incremental_s"] = _timed(rag_utils.index_codebase, head_docs, repo.head_sha)
+        result["embed_batches_incremental"] = embeddings.batches - batches
+    return result
+
+def bench_end_to_end(n_files, args):
+    """Two full agent runs over the same fake repo: cold caches, then warm."""
+    repo = FakeRepository(n_files, args.diff_files, args.diff_functions, args.api_ms / 1000)
+    runs = {}
+    timings = []
+    hook = lambda name, start, end: timings.append((name, end - start))
+    graph.NODE_TIMING_HOOKS.append(hook)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            _isolate(tmp, args)
+            for label in ("cold", "warm"):
+                timings.clear()
+                repo.calls.clear()
+                # A fresh checkpoint DB per run, or the warm run would find the cold one completed.
+                main.CHECKPOINT_DB = os.path.join(tmp, f"checkpoints-{label}.sqlite")
+                with _quiet(args.verbose):
+                    ok, seconds = _timed(
+                        asyncio.run, main.arun_agent(repo.full_name, FakeGithub(repo), base_sha=repo.base_sha)
+                    )
+                with open(metrics.TRACE_FILE) as f:
+                    trace = [json.loads(line) for line in f]
+                runs[label] = {
+                    "ok": bool(ok),
+                    "total_s": seconds,
+                    "nodes_s": {name: round(duration, 4) for name, duration in timings},
+                    "api_calls": dict(repo.calls),
+                    "node_metrics": {r["node"]: r for r in trace if r["type"] == "node" and r["run_id"] == trace[-1]["run_id"]},
+                    "skipped": trace[-1].get("skipped", {}),
+                }
+    finally:
+        graph.NODE_TIMING_HOOKS.remove(hook)
+    return runs
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def run(args):
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "settings": vars(args),
+            "max_files": github_utils.MAX_FILES,
+            "chunker": chunking.CHUNKER,
+        },
+        "results": [],
+    }
+    for n_files in args.sizes:
+        print(f"▶ {n_files} files...", flush=True)
+        entry = {"files": n_files, **bench_index(n_files, args)}
+        print(f"   fetch {entry['fetch_s']:.2f}s, chunk {entry['chunk_s']:.2f}s, index cold {entry['index_cold_s']:.2f}s"
+              f" / warm {entry['index_warm_s']:.2f}s / incremental {entry['index_incremental_s']:.2f}s")
+        if not args.skip_e2e:
+            entry["end_to_end"] = bench_end_to_end(n_files, args)
+            cold, warm = entry["end_to_end"]["cold"], entry["end_to_end"]["warm"]
+            print(f"   end-to-end cold {cold['total_s']:.2f}s, warm {warm['total_s']:.2f}s")
+        report["results"].append(entry)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark for the Living Document agent.")
+    parser.add_argument("--sizes", default="10,100,1000,10000",
+                        type=lambda s: [int(x) for x in s.split(",") if x.strip()], help="repo sizes in files")
+    parser.add_argument("--diff-files", type=int, default=5, help="files changed between base and head")
+    parser.add_argument("--diff-functions", type=int, default=2, help="functions added to each changed file")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="fake LLM generation speed")
+    parser.add_argument("--response-tokens", type=int, default=80, help="length of generic fake LLM replies")
+    parser.add_argument("--embed-ms", type=float, default=0.5, help="fake embedding latency per chunk")
+    parser.add_argument("--api-ms", type=float, default=2.0, help="fake GitHub latency per API call")
+    parser.add_argument("--summaries", action="store_true", help="also build the cached repo overview")
+    parser.add_argument("--skip-e2e", action="store_true", help="only benchmark fetch/chunk/index")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--verbose", action="store_true", help="show the agent's own output")
+    run(parser.parse_args())
@@ -1,55 +1,197 @@
+import asyncio
 import datetime
+import functools
+import inspect
+import time
 from typing import TypedDict, List, Any
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from github import GithubException
 
 from utils import github_utils
 from utils import rag_utils
+from utils import diff_utils
+from utils import summaries
+from utils import metrics
+from utils import index_store
 from agents import agents
 from agents.state import AgentState
 
+# One retrieval query per README section the audit checks.
+AUDIT_QUERIES = [
+    "What is the purpose of this project? Main features.",
+    "Tech stack: frameworks, libraries and dependencies used.",
+    "Installation and setup: requirements, install commands, environment variables.",
+    "Usage: how to run it, entry points, command line arguments and examples.",
+    "Configuration options and settings.",
+]
 
-def setup_node(state: AgentState):
-    print("---Node: Setup ---")
-    repo = state['repo']
-    
 
-    current_sha = github_utils.get_current_commit_sha(repo)
+# Called as hook(name, start, end) after every node; used by the benchmark harness.
+NODE_TIMING_HOOKS = []
+
+def timed_node(name, fn):
+    """
+    Prints when a node started/finished relative to the run start, so overlapping branches are visible.
+    Everything counted while the node runs (API calls, tokens, ...) is attributed to it in the run's metrics.
+    """
+    def report(state, start):
+        end = time.time()
+        run_start = state.get('run_started_at') or start
+        print(f"   ⏱ {name}: +{start - run_start:.1f}s -> +{end - run_start:.1f}s ({end - start:.1f}s)")
+        for hook in NODE_TIMING_HOOKS:
+            hook(name, start, end)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(state, **kwargs):
+            start = time.time()
+            token = metrics.enter_node(name)
+            try:
+                return await fn(state, **kwargs)
+            finally:
+                metrics.exit_node(token, name, start, time.time())
+                report(state, start)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(state, **kwargs):
+        start = time.time()
+        token = metrics.enter_node(name)
+        try:
+            return fn(state, **kwargs)
+        finally:
+            metrics.exit_node(token, name, start, time.time())
+            report(state, start)
+    return wrapper
+
+def get_repo(config: RunnableConfig):
+    """The PyGithub repo travels in the run config, not the (checkpointed) state."""
+    return config["configurable"]["repo"]
+
+# What each kind of change (diff_utils.classify_change) lets a run skip, and why.
+SKIPS = {
+    "none": (["setup", "audit", "writer", "historian", "packager", "publisher"], "nothing changed"),
+    "docs": (["setup", "audit", "writer", "historian", "packager", "publisher"], "only docs changed"),
+    "tests": (["setup", "audit", "writer"], "only tests changed; README unaffected"),
+    "config": (["setup", "audit", "writer"], "only config changed; README unaffected"),
+    "mixed": (["setup", "audit", "writer"], "no source changed; README unaffected"),
+}
+
+def precheck_node(state: AgentState, config: RunnableConfig):
+    """One compare call: what changed decides which stages run (see route_after_precheck)."""
+    print("---Node: Precheck ---")
+    repo = get_repo(config)
+    commit_range = state.get('commit_range')
+    # The scheduler passes the range it already fetched; only reuse it for exactly this base..head.
+    wanted = (state.get('base_sha') or None, state.get('head_sha'))
+    if not commit_range or (commit_range.get('base'), commit_range.get('head')) != wanted:
+        commit_range = github_utils.fetch_commit_range(repo, state.get('base_sha'), state.get('head_sha'))
+    change_kind = diff_utils.classify_change([f['filename'] for f in commit_range['files']])
+    if not state.get('base_sha'):
+        # First run: the README may never have been written, so always do the full pass.
+        change_kind = "source"
+    print(f"   Change: {change_kind} ({len(commit_range['files'])} files)")
+
+    stages, reason = SKIPS.get(change_kind, ([], ""))
+    for stage in stages:
+        metrics.skip(stage, reason)
+    if stages:
+        print(f"   ⏭ Skipping {', '.join(stages)}: {reason}")
+
+    return {
+        "commit_range": commit_range,
+        "latest_diff": github_utils.fetch_latest_commit_diff(repo, commit_range),
+        "change_kind": change_kind,
+    }
+
+def route_after_precheck(state: AgentState):
+    kind = state.get('change_kind')
+    if kind == "source":
+        return "setup"
+    if kind in SKIPS and "historian" not in SKIPS[kind][0]:
+        return "historian"
+    return END
+
+def setup_node(state: AgentState, config: RunnableConfig):
+    print("---Node: Setup ---")
+    repo = get_repo(config)
+    current_sha = (state.get('commit_range') or {}).get('head') or state.get('head_sha')
     print(f"   Target Commit: {current_sha[:7]}")
 
-    documents = github_utils.fetch_repo_file_structure(repo)
-    if not documents: return {"file_updates": []}
-    
+    documents = github_utils.fetch_repo_file_structure(
+        repo,
+        mode=state.get('fetch_mode') or "tree",
+        ref=current_sha,
+        local_path=state.get('local_repo_path')
+    )
+    if not documents:
+        # Carrying on would audit an empty index against an empty README and replace the real one.
+        raise RuntimeError(f"No files fetched for {repo.full_name}@{current_sha[:7]}; refusing to continue")
+
+    # Each repo has its own index directory; other repos' indexes stay warm.
+    with index_store.building(repo.full_name) as db_path:
+        rag_utils.index_codebase(documents, current_sha, db_path=db_path)
 
-    retriever = rag_utils.index_codebase(documents, current_sha)
+    overview = ""
+    if summaries.REPO_SUMMARIES:
+        overview = summaries.build_overview(
+            documents, agents.summarize_file, agents.summarize_directory, model=agents.get_llm().model
+        )
     
-    diff = github_utils.fetch_latest_commit_diff(repo)
     try:
-        readme = repo.get_readme().decoded_content.decode("utf-8")
-    except:
-        readme = ""
-        
+        readme = repo.get_readme(ref=current_sha).decoded_content.decode("utf-8")
+    except GithubException as e:
+        # None means "this repo has no README" and is the only case the writer drafts one from scratch.
+        if e.status != 404:
+            raise
+        readme = None
+
+    # The packager prepends to this; reuse the fetched copy instead of another API call.
+    changelog = next((d['content'] for d in documents if d['source'] == "CHANGELOG.md"), None)
+
     return {
-        "retriever": retriever, 
-        "latest_diff": diff, 
         "current_readme": readme,
+        "repo_overview": overview,
+        "current_changelog": changelog if changelog is not None else fetch_changelog(repo, current_sha),
         "revision_count": 0,
         "file_updates": []
     }
 
-def audit_node(state: AgentState):
+def fetch_changelog(repo, ref):
+    try:
+        return repo.get_contents("CHANGELOG.md", ref=ref).decoded_content.decode("utf-8")
+    except GithubException as e:
+        if e.status != 404:
+            raise
+        return ""
+
+async def audit_node(state: AgentState, config: RunnableConfig):
     print("---Node: Audit ---")
-    retriever = state['retriever']
     readme = state['current_readme']
     
-    code_reality = rag_utils.query_rag(retriever, "What is the purpose of this project? List Tech Stack, Main Features.")
+    overview = state.get('repo_overview')
+    budget = rag_utils.CONTEXT_TOKEN_BUDGET
+    if overview:
+        # The overview covers the whole repo; retrieved code fills what's left of the budget.
+        budget = max(budget - diff_utils.estimate_tokens(overview), budget // 3)
+
+    # Shared lock: the index can't be evicted or rebuilt while we read it.
+    async with index_store.areading(get_repo(config).full_name) as db_path:
+        if not db_path:
+            raise RuntimeError(f"No index for {get_repo(config).full_name}; setup must run before the audit")
+        retriever = await asyncio.to_thread(rag_utils.open_retriever, db_path)
+        code = await rag_utils.abuild_context(retriever, AUDIT_QUERIES, budget)
+
+    code_reality = f"Repository overview:\n{overview}\n\nRelevant code:\n{code}" if overview else code
     
-    if not readme.strip():
+    if readme is None:
         return {"missing_features": "CREATE_FRESH", "code_reality": code_reality}
     
-    missing = agents.audit_readme(readme, code_reality)
+    missing = await agents.aaudit_readme(readme, code_reality)
     return {"code_reality": code_reality, "missing_features": missing}
 
-def writer_node(state: AgentState):
+async def writer_node(state: AgentState):
     print("---Node: Writer ---")
     if state.get('draft_content'):
         return {} 
@@ -60,22 +202,37 @@ def writer_node(state: AgentState):
     
     draft = ""
     if missing == "CREATE_FRESH":
-        draft = agents.draft_fresh_readme(code_reality)
+        draft = await agents.adraft_fresh_readme(code_reality)
     elif "NO_CHANGES" not in missing:
-        draft = agents.integrate_changes(readme, missing)
+        draft = await agents.apatch_readme(readme, missing)
     else:
+        metrics.skip("writer", "audit found no gaps")
         return {"draft_content": None}
 
     return {"draft_content": draft}
 
 
-def historian_node(state: AgentState):
+async def historian_node(state: AgentState):
     print("---Node: Historian ---")
-    diff = state['latest_diff']
-    entry = agents.generate_changelog(diff)
+    commit_range = state.get('commit_range')
+    if not commit_range:
+        entry = await agents.agenerate_changelog(state['latest_diff'])
+        return {"changelog_entry": entry}
+
+    diff, overflow = diff_utils.pack_diff(commit_range)
+    if overflow:
+        # Over budget: summarize the rest per group concurrently, then reduce into one entry.
+        groups, leftover = diff_utils.group_changes(overflow)
+        print(f"   Diff over budget: summarizing {len(overflow)} more files in {len(groups)} groups...")
+        group_summaries = await asyncio.gather(*(agents.asummarize_diff_group(g) for g in groups))
+        diff += "\n\nSummaries of the remaining changes:\n" + "\n".join(s for s in group_summaries if s)
+        if leftover:
+            diff += f"\nAlso changed: {', '.join(leftover)}"
+
+    entry = await agents.agenerate_changelog(diff)
     return {"changelog_entry": entry}
 
-def packaging_node(state: AgentState):
+def packaging_node(state: AgentState, config: RunnableConfig):
     print("---Node: Packaging ---")
     draft = state.get('draft_content')
     final_text = None
@@ -88,45 +245,57 @@ def packaging_node(state: AgentState):
         updates.append({"path": "README.md", "content": final_text})
         
     if state.get('changelog_entry'):
-        repo = state['repo']
-        try:
-            current_log = repo.get_contents("CHANGELOG.md").decoded_content.decode("utf-8")
-        except:
-            current_log = "# Changelog\n\n"
-        import datetime
+        current_log = state.get('current_changelog')
+        if current_log is None:
+            # Setup was skipped, so the changelog hasn't been fetched yet.
+            current_log = fetch_changelog(get_repo(config), (state.get('commit_range') or {}).get('head'))
+        current_log = current_log or "# Changelog\n\n"
         today = datetime.datetime.now().strftime("%Y-%m-%d")
         new_log = current_log.replace("# Changelog", f"# Changelog\n\n## {today}\n{state['changelog_entry']}")
         updates.append({"path": "CHANGELOG.md", "content": new_log})
-        
+
+    if not updates:
+        metrics.skip("publisher", "no file updates")
     return {"file_updates": updates}
 
-def pr_node(state: AgentState):
+def route_after_packaging(state: AgentState):
+    return "publisher" if state.get('file_updates') else END
+
+def pr_node(state: AgentState, config: RunnableConfig):
     print("---Node: Publisher ---")
-    updates = state['file_updates']
-    if updates:
-        url = github_utils.create_multi_file_pr(state['repo'], updates, "docs: Update", "Agent Update")
-        print(f"✅ Success! PR: {url}")
-    else:
-        print("No updates.")
+    url = github_utils.create_multi_file_pr(
+        get_repo(config), state['file_updates'], "docs: Update", "Agent Update",
+        base_sha=(state.get('commit_range') or {}).get('head')
+    )
+    print(f"✅ Success! PR: {url}")
     return {}
 
-def build_graph():
+def build_graph(checkpointer=None):
+    """With a checkpointer, every node's output is saved and a failed run resumes where it stopped."""
     workflow = StateGraph(AgentState)
     
-    workflow.add_node("setup", setup_node)
-    workflow.add_node("audit", audit_node)
-    workflow.add_node("writer", writer_node)
-    workflow.add_node("historian", historian_node)
-    workflow.add_node("packager", packaging_node)
-    workflow.add_node("publisher", pr_node)
+    workflow.add_node("precheck", timed_node("precheck", precheck_node))
+    workflow.add_node("setup", timed_node("setup", setup_node))
+    workflow.add_node("audit", timed_node("audit", audit_node))
+    workflow.add_node("writer", timed_node("writer", writer_node))
+    workflow.add_node("historian", timed_node("historian", historian_node))
+    workflow.add_node("packager", timed_node("packager", packaging_node))
+    workflow.add_node("publisher", timed_node("publisher", pr_node))
     
-    workflow.set_entry_point("setup")
+    workflow.set_entry_point("precheck")
     
+    # Source changes take the full path; tests/config-only changes only get a changelog entry.
+    workflow.add_conditional_edges("precheck", route_after_precheck, ["setup", "historian", END])
+    # historian only needs the diff from precheck, so it runs alongside audit -> writer.
     workflow.add_edge("setup", "audit")
+    workflow.add_edge("setup", "historian")
     workflow.add_edge("audit", "writer")
-    workflow.add_edge("writer", "historian")
-    workflow.add_edge("historian", "packager")
-    workflow.add_edge("packager", "publisher")
+    workflow.add_edge(["writer", "historian"], "packager")
+    # Without setup there's no writer to join with.
+    workflow.add_conditional_edges(
+        "historian", lambda state: END if state.get('change_kind') == "source" else "packager", ["packager", END]
+    )
+    workflow.add_conditional_edges("packager", route_after_packaging, ["publisher", END])
     workflow.add_edge("publisher", END)
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
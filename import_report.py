@@ -0,0 +1,89 @@
+"""
+Cold-start report: imports each target in a fresh interpreter under
+`python -X importtime` and summarizes wall time, peak RSS, module count and
+the packages that cost the most.
+
+    python import_report.py                      # scheduler vs. the full run stack
+    python import_report.py --targets main,graph --output import_report.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# "scheduler" is what the daemon pays at startup; "scheduler+graph" is what the first run adds.
+DEFAULT_TARGETS = ["scheduler", "scheduler+graph"]
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+# Runs in the child after the imports; prints one JSON line on stdout.
+PROBE = """
+import time, resource, sys
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+import json
+print(json.dumps({{"seconds": seconds, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "modules": len(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr):
+    """{root package: self microseconds} summed over every module under it."""
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            packages[match.group(4).split(".")[0]] += int(match.group(1))
+    return packages
+
+def measure(target, top=10):
+    modules = [m for m in target.split("+") if m]
+    env = dict(os.environ, AGENT_QUIET="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(imports="\n".join(f"import {m}" for m in modules))],
+        capture_output=True, text=True, cwd=ROOT, env=env
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {target} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    packages = parse_importtime(proc.stderr)
+    result["top_packages_ms"] = {
+        name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+    }
+    return result
+
+def run(args):
+    report = {"python": sys.version.split()[0], "targets": {}}
+    for target in args.targets:
+        runs = [measure(target, args.top) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        report["targets"][target] = best
+        print(f"▶ {target}: {best['seconds']:.2f}s, {best['max_rss_mb']:.0f} MB peak RSS, {best['modules']} modules")
+        for name, ms in best["top_packages_ms"].items():
+            print(f"   {name:<28} {ms:>8.1f} ms")
+
+    if len(args.targets) == 2:
+        first, second = (report["targets"][t] for t in args.targets)
+        print(f"Δ {args.targets[1]} - {args.targets[0]}: {second['seconds'] - first['seconds']:+.2f}s, "
+              f"{second['max_rss_mb'] - first['max_rss_mb']:+.0f} MB, {second['modules'] - first['modules']:+d} modules")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time and memory report for the agent's entry points.")
+    parser.add_argument("--targets", default=",".join(DEFAULT_TARGETS),
+                        type=lambda s: [t for t in s.split(",") if t.strip()],
+                        help="comma separated; join modules with + to import them together")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per target; the fastest is kept")
+    parser.add_argument("--top", type=int, default=10, help="packages listed per target")
+    parser.add_argument("--output", help="also write the report as JSON")
+    run(parser.parse_args())
@@ -1,45 +1,139 @@
+import argparse
+import asyncio
+import contextlib
+import importlib
 import os
 import sys
+import time
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from utils import github_utils
-import graph 
+from utils import github_utils, metrics
 
 load_dotenv()
 
-def run_agent():
+# Each node's output is saved per (repo, head SHA), so a failed run resumes instead of starting over.
+CHECKPOINTS = os.getenv("AGENT_CHECKPOINTS", "1").lower() not in ("0", "false", "no")
+CHECKPOINT_DB = os.getenv(
+    "AGENT_CHECKPOINT_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "living-document", "checkpoints.sqlite")
+)
+
+@contextlib.asynccontextmanager
+async def open_checkpointer():
+    """Yields the SQLite checkpointer, or None when AGENT_CHECKPOINTS=0."""
+    if not CHECKPOINTS:
+        yield None
+        return
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    os.makedirs(os.path.dirname(CHECKPOINT_DB) or ".", exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as saver:
+        yield saver
+
+def thread_id_for(repo_name, head_sha):
+    return f"{repo_name}@{head_sha}"
+
+async def _thread_ids(checkpointer, repo_name=None):
+    """Saved thread ids, all or one repo's: one indexed query instead of loading every checkpoint."""
+    await checkpointer.setup()
+    query, params = "SELECT DISTINCT thread_id FROM checkpoints", ()
+    if repo_name:
+        # Thread ids are "<repo>@<sha>"; "A" sorts right after "@".
+        query += " WHERE thread_id >= ? AND thread_id < ?"
+        params = (f"{repo_name}@", f"{repo_name}A")
+    async with checkpointer.lock, checkpointer.conn.execute(query, params) as cursor:
+        return [row[0] async for row in cursor]
+
+async def list_checkpoints(checkpointer, repo_name=None):
+    """[(thread_id, saved_at, next_nodes)] for every saved run; next_nodes is empty once a run completed."""
+    import graph
+
+    app = graph.build_graph(checkpointer)
+    threads = []
+    for thread_id in await _thread_ids(checkpointer, repo_name):
+        snapshot = await app.aget_state({"configurable": {"thread_id": thread_id}})
+        threads.append((thread_id, snapshot.created_at, snapshot.next))
+    return threads
+
+async def clear_checkpoints(checkpointer, repo_name=None, keep=None):
+    """Deletes saved runs (all, or one repo's), except the thread `keep`. Returns how many."""
+    threads = [t for t in await _thread_ids(checkpointer, repo_name) if t != keep]
+    for thread_id in threads:
+        await checkpointer.adelete_thread(thread_id)
+    return len(threads)
+
+async def arun_agent(repo_name=None, g=None, base_sha=None, head_sha=None, commit_range=None):
+    """
+    Runs the full workflow for one repo. Returns the final state when the workflow
+    finished (its commit_range["head"] is the commit that was processed), else None.
+    The scheduler awaits this directly, passing its own client, the repo name, the
+    last processed SHA and the head it queued, so the changelog covers exactly base..head.
+    Without head_sha the branch head is read. A commit_range the caller already fetched
+    for base..head is reused by the precheck instead of comparing again.
+    """
     print("---Living Documentation Agent---")
     
-    token = os.getenv("GITHUB_TOKEN")
-    if not token: 
-        return print("❌ Error: GITHUB_TOKEN missing. Check your .env file.")
-    
-    try:
-        g = github_utils.connect_to_github(token)
-    except Exception as e:
-        return print(f"❌ Connection Failed: {e}")
+    if g is None:
+        token = os.getenv("GITHUB_TOKEN")
+        if not token: 
+            return print("❌ Error: GITHUB_TOKEN missing. Check your .env file.")
+        
+        try:
+            g = github_utils.connect_to_github(token)
+        except Exception as e:
+            return print(f"❌ Connection Failed: {e}")
 
-    if os.getenv("GITHUB_REPOSITORY"):
+    if repo_name:
+        print(f"Targeting: {repo_name}")
+    elif os.getenv("GITHUB_REPOSITORY"):
         repo_name = os.getenv("GITHUB_REPOSITORY")
         print(f"Auto-Targeting: {repo_name}")
     else:
         raw_input = input("Enter GitHub repo (e.g. username/project): ")
         repo_name = github_utils.extract_repo_path(raw_input)
     
+    # API calls, embedding batches and tokens for this run go to the metrics trace.
+    run, token = metrics.start_run(repo_name)
+    final_state = None
+    try:
+        final_state = await _run_workflow(g, repo_name, base_sha, head_sha, commit_range)
+        return final_state
+    finally:
+        head = ((final_state or {}).get('commit_range') or {}).get('head')
+        metrics.finish_run(run, token, final_state is not None, head)
+
+async def _run_workflow(g, repo_name, base_sha, head_sha=None, commit_range=None):
+    """Returns the final graph state, or None if the repo can't be opened."""
     print(f"Locating {repo_name}...")
     try:
-        repo = g.get_repo(repo_name)
+        repo = await asyncio.to_thread(g.get_repo, repo_name)
     except:
-        return print(f"❌ Repo '{repo_name}' not found or token lacks permissions.")
+        print(f"❌ Repo '{repo_name}' not found or token lacks permissions.")
+        return None
+
+    # The run is checkpointed under repo@head, so a retry of the same commit resumes.
+    head_sha = head_sha or await asyncio.to_thread(github_utils.get_current_commit_sha, repo)
+    thread_id = thread_id_for(repo_name, head_sha)
+    config = {"configurable": {"thread_id": thread_id, "repo": repo}}
+
+    # langgraph, langchain and the agents load on the first run, not when the scheduler
+    # imports main; in a thread so the scheduler's polling isn't blocked meanwhile.
+    graph = await asyncio.to_thread(importlib.import_module, "graph")
 
     print("Initializing Agent State...")
     initial_state = {
-        "repo": repo,
-        "retriever": None,
+        "head_sha": head_sha,
+        "fetch_mode": os.getenv("REPO_SOURCE", "tree"),
+        "local_repo_path": os.getenv("LOCAL_REPO_PATH", ""),
+        "base_sha": base_sha or "",
+        "commit_range": commit_range or {},
+        "change_kind": "",
         "latest_diff": "",
         "current_readme": "",
+        "repo_overview": "",
+        "current_changelog": None,
         "code_reality": "",
         "missing_features": "",
         "draft_content": "",
@@ -47,13 +141,55 @@ def run_agent():
         "revision_count": 0,
         "final_readme": "",
         "changelog_entry": "",
-        "file_updates": []
+        "file_updates": [],
+        "run_started_at": time.time()
     }
 
-    print("⚡ Starting Workflow...")
-    app = graph.build_graph()
-    app.invoke(initial_state)
+    async with open_checkpointer() as checkpointer:
+        app = graph.build_graph(checkpointer)
+        snapshot = await app.aget_state(config) if checkpointer else None
+        if snapshot and snapshot.values and not snapshot.next:
+            print(f"✅ {thread_id} already completed; nothing to do.")
+            return snapshot.values
+        if snapshot and snapshot.next:
+            print(f"⚡ Resuming {thread_id} at: {', '.join(snapshot.next)}")
+            final_state = await app.ainvoke(None, config)
+        else:
+            print("⚡ Starting Workflow...")
+            final_state = await app.ainvoke(initial_state, config)
+        if checkpointer:
+            # Older heads of this repo can't be resumed usefully any more.
+            await clear_checkpoints(checkpointer, repo_name, keep=thread_id)
     print("✅ Workflow Finished Successfully.")
+    return final_state
+
+def run_agent(repo_name=None):
+    return asyncio.run(arun_agent(repo_name))
+
+async def _checkpoint_command(list_repo=None, clear_repo=None):
+    async with open_checkpointer() as checkpointer:
+        if checkpointer is None:
+            return print("Checkpoints are disabled (AGENT_CHECKPOINTS=0).")
+        if clear_repo is not None:
+            removed = await clear_checkpoints(checkpointer, clear_repo or None)
+            return print(f"Removed {removed} saved run(s) from {CHECKPOINT_DB}.")
+        threads = await list_checkpoints(checkpointer, list_repo or None)
+        if not threads:
+            return print(f"No saved runs in {CHECKPOINT_DB}.")
+        for thread_id, saved_at, next_nodes in threads:
+            status = f"resumes at {', '.join(next_nodes)}" if next_nodes else "completed"
+            print(f"{thread_id}  {saved_at}  {status}")
 
 if __name__ == "__main__":
-    run_agent()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Living Documentation Agent")
+    parser.add_argument("repo", nargs="?", help="owner/name (defaults to GITHUB_REPOSITORY or a prompt)")
+    parser.add_argument("--list-checkpoints", nargs="?", const="", metavar="REPO",
+                        help="show saved runs, optionally for one repo")
+    parser.add_argument("--clear-checkpoints", nargs="?", const="", metavar="REPO",
+                        help="delete saved runs, optionally for one repo")
+    args = parser.parse_args()
+
+    if args.list_checkpoints is not None or args.clear_checkpoints is not None:
+        asyncio.run(_checkpoint_command(args.list_checkpoints, args.clear_checkpoints))
+    else:
+        run_agent(github_utils.extract_repo_path(args.repo) if args.repo else None)
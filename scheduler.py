@@ -1,80 +1,173 @@
-import time
+import asyncio
+import json
 import os
+import random
 import sys
+import time
 from dotenv import load_dotenv
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-import utils.github_utils as github_utils
-import main 
-
 load_dotenv()
 
+# The scheduler is a daemon: don't echo every LLM token to the terminal.
+os.environ.setdefault("AGENT_QUIET", "1")
+
+import utils.github_utils as github_utils
+# Cheap: main loads langgraph, langchain and the LLM clients on the first run, not at import.
+import main
+
 CHECK_INTERVAL_HOURS = 0.0833  # 5 Minutes
-STATE_FILE = ".agent_memory" 
+POLL_JITTER = 0.2  # +/- 20% so hundreds of repos don't poll in lockstep
+STATE_FILE = ".agent_memory"
+REPOS_FILE = os.getenv("WATCH_REPOS_FILE", "repos.txt")
+# Each repo has its own locked index (utils/index_store), so runs for different repos
+# can overlap; the default stays at 1 because they all share one Ollama server.
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", 1))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", 100))
+
+
+class StateStore:
+    """Per-repo last processed SHAs, kept as one JSON object in STATE_FILE."""
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.legacy_sha = None
+        self._shas = {}
+        self._lock = asyncio.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                raw = f.read().strip()
+            try:
+                self._shas = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                # Old single-repo format: the file only held one SHA.
+                self.legacy_sha = raw
+
+    def adopt_legacy(self, repo_name):
+        if self.legacy_sha and repo_name not in self._shas:
+            self._shas[repo_name] = self.legacy_sha
+            self._write()
+
+    def get(self, repo_name):
+        return self._shas.get(repo_name)
+
+    async def set(self, repo_name, sha):
+        async with self._lock:
+            self._shas[repo_name] = sha
+            self._write()
+
+    def _write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._shas, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def load_repo_list():
+    """Repos come from WATCH_REPOS (comma separated), then REPOS_FILE (one per line), then a prompt."""
+    if os.getenv("WATCH_REPOS"):
+        raw = os.getenv("WATCH_REPOS").split(",")
+    elif os.path.exists(REPOS_FILE):
+        with open(REPOS_FILE, "r") as f:
+            raw = [line for line in f if not line.strip().startswith("#")]
+    else:
+        raw = [input("Enter GitHub repo to monitor: ")]
+    repos = [github_utils.extract_repo_path(r.strip()) for r in raw if r.strip()]
+    return list(dict.fromkeys(repos))
+
+def _next_poll_delay():
+    interval = CHECK_INTERVAL_HOURS * 3600
+    return interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+async def check_repo(g, repo_name, state, queue, pending):
+    if repo_name in pending:
+        print(f"[{repo_name}] Run already queued/in progress. Skipping check.")
+        return
 
-def get_last_processed_sha():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            return f.read().strip()
-    return None
+    repo = await asyncio.to_thread(g.get_repo, repo_name)
+    current_sha = await asyncio.to_thread(github_utils.get_current_commit_sha, repo)
+    last_sha = state.get(repo_name)
 
-def save_current_sha(sha):
-    with open(STATE_FILE, "w") as f:
-        f.write(sha)
+    if current_sha == last_sha:
+        print(f"[{repo_name}] No changes ({current_sha[:7]}).")
+        return
 
-def automation_loop():
+    print(f"[{repo_name}] {last_sha[:7] if last_sha else 'None'} -> {current_sha[:7]}")
+    # Judge the whole range since the last processed SHA, not just the newest commit.
+    commit_range = await asyncio.to_thread(github_utils.fetch_commit_range, repo, last_sha, current_sha)
+    if github_utils.should_ignore_commit(repo, commit_range):
+        print(f"[{repo_name}] Commit ignored (Docs/Skip-CI). Updating memory to skip...")
+        await state.set(repo_name, current_sha)
+    else:
+        print(f"[{repo_name}] NEW CODE DETECTED! Queueing agent run...")
+        pending.add(repo_name)
+        # The run reuses this range instead of asking for the same compare again.
+        await queue.put((repo_name, current_sha, commit_range))
+
+async def watch_repo(g, repo_name, state, queue, pending):
+    # Spread the first checks out too, not just the later ones.
+    await asyncio.sleep(random.uniform(0, POLL_JITTER * CHECK_INTERVAL_HOURS * 3600))
+    while True:
+        try:
+            await check_repo(g, repo_name, state, queue, pending)
+        except Exception as e:
+            print(f"❌ [{repo_name}] Error while checking: {e}")
+        await asyncio.sleep(_next_poll_delay())
+
+async def agent_worker(worker_id, g, state, queue, pending):
+    while True:
+        repo_name, sha, commit_range = await queue.get()
+        print(f"[worker {worker_id}] Waking up Agent for {repo_name} @ {sha[:7]}...")
+        try:
+            final_state = await main.arun_agent(
+                repo_name, g, base_sha=state.get(repo_name), head_sha=sha, commit_range=commit_range
+            )
+            if final_state:
+                # Exactly the head the run covered; later commits are picked up by the next tick.
+                await state.set(repo_name, (final_state.get('commit_range') or {}).get('head') or sha)
+                print(f"   ✅ [{repo_name}] Documentation synced. Memory updated.")
+        except Exception as e:
+            print(f"❌ [{repo_name}] Agent run failed: {e}")
+        finally:
+            pending.discard(repo_name)
+            queue.task_done()
+
+async def automation_loop():
     print("---Living Documentation Scheduler Started ---")
-    
+
     token = os.getenv("GITHUB_TOKEN")
     if not token: return print("❌ Error: GITHUB_TOKEN missing.")
-    
+
     try:
         g = github_utils.connect_to_github(token)
     except Exception as e:
         return print(f"❌ Connection Failed: {e}")
-    
-    raw_input = input("Enter GitHub repo to monitor: ")
-    repo_name = github_utils.extract_repo_path(raw_input)
-    
-    print(f"Watching: {repo_name}")
-    print(f"Check Interval: {CHECK_INTERVAL_HOURS} hours")
-    print("---------------------------------------------------")
 
-    while True:
-        try:
-            print(f"\n[{time.strftime('%H:%M:%S')}] Checking for updates...")
-            
-            repo = g.get_repo(repo_name)
-            current_sha = github_utils.get_current_commit_sha(repo)
-            last_sha = get_last_processed_sha()
-
-            print(f"   Current SHA: {current_sha[:7]}")
-            print(f"   Last SHA:    {last_sha[:7] if last_sha else 'None'}")
-
-            if current_sha == last_sha:
-                print("No changes detected. Sleeping...")
-            else:
-                if github_utils.should_ignore_commit(repo):
-                    print("Commit ignored (Docs/Skip-CI). Updating memory to skip...")
-                    save_current_sha(current_sha)
-                else:
-                    print("NEW CODE DETECTED! Waking up Agent...")
-                    
-                    os.environ["GITHUB_REPOSITORY"] = repo_name
-                    
-                    main.run_agent()
-                    
-                    save_current_sha(current_sha)
-                    print("   ✅ Documentation synced. Memory updated.")
-
-        except KeyboardInterrupt:
-            print("\n🛑 Scheduler stopped by user.")
-            break
-        except Exception as e:
-            print(f"❌ Error in scheduler loop: {e}")
+    repos = load_repo_list()
+    if not repos: return print("❌ Error: No repos to watch.")
 
-        time.sleep(CHECK_INTERVAL_HOURS * 3600)
+    state = StateStore()
+    if len(repos) == 1:
+        state.adopt_legacy(repos[0])
+
+    print(f"Watching {len(repos)} repo(s): {', '.join(repos[:5])}{' ...' if len(repos) > 5 else ''}")
+    print(f"Check Interval: {CHECK_INTERVAL_HOURS} hours (+/-{int(POLL_JITTER * 100)}%)")
+    print(f"Agent Workers: {MAX_CONCURRENT_RUNS}")
+    print("---------------------------------------------------")
+
+    queue = asyncio.Queue(maxsize=MAX_QUEUED_RUNS)
+    pending = set()
+    tasks = [
+        asyncio.create_task(agent_worker(i, g, state, queue, pending))
+        for i in range(MAX_CONCURRENT_RUNS)
+    ]
+    tasks += [asyncio.create_task(watch_repo(g, r, state, queue, pending)) for r in repos]
+    await asyncio.gather(*tasks)
 
 if __name__ == "__main__":
-    automation_loop()
\ No newline at end of file
+    try:
+        asyncio.run(automation_loop())
+    except KeyboardInterrupt:
+        print(f"\n🛑 [{time.strftime('%H:%M:%S')}] Scheduler stopped by user.")
@@ -0,0 +1,101 @@
+import unittest
+
+from utils import chunking
+
+PYTHON = '''import os
+
+CONSTANT = 1
+
+
+@decorator
+def first(a):
+    return a + 1
+
+
+class Second:
+    def method(self):
+        return os.sep
+'''
+
+GO = '''package main
+
+import "fmt"
+
+func First() {
+	fmt.Println("one")
+}
+
+type Second struct {
+	Name string
+}
+'''
+
+
+def big_function(name, lines=60):
+    body = "".join(f"    value_{i} = compute({i}, 'padding padding padding')\n" for i in range(lines))
+    return f"def {name}():\n{body}    return value_0\n"
+
+
+class StructuralChunkTest(unittest.TestCase):
+    def test_python_chunks_are_whole_lines_with_symbols(self):
+        chunks = chunking.split_file("pkg/mod.py", PYTHON)
+
+        self.assertEqual(len(chunks), 1)
+        chunk = chunks[0]
+        self.assertEqual(chunk.metadata["chunker"], "structural")
+        self.assertEqual((chunk.metadata["start_line"], chunk.metadata["end_line"]), (1, PYTHON.count("\n")))
+        self.assertEqual(chunk.metadata["symbols"], "first, Second")
+
+    def test_python_definitions_are_not_split_when_they_fit(self):
+        text = big_function("alpha", 25) + "\n\n" + big_function("beta", 25)
+        chunks = chunking.split_file("pkg/mod.py", text)
+        lines = text.splitlines(keepends=True)
+
+        self.assertEqual([c.metadata["symbols"] for c in chunks], ["alpha", "beta"])
+        for chunk in chunks:
+            start, end = chunk.metadata["start_line"], chunk.metadata["end_line"]
+            self.assertEqual(chunk.page_content, "".join(lines[start - 1:end]))
+            self.assertLessEqual(len(chunk.page_content), chunking.MAX_CHUNK_CHARS)
+        # Each definition starts its own chunk.
+        self.assertTrue(chunks[1].page_content.lstrip("\n").startswith("def beta():"))
+
+    def test_oversized_definition_is_packed_at_line_boundaries(self):
+        text = big_function("huge", 120)
+        chunks = chunking.split_file("pkg/mod.py", text)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(c.page_content for c in chunks), text)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk.page_content), chunking.MAX_CHUNK_CHARS)
+            self.assertEqual(chunk.metadata["symbols"], "huge")
+
+    def test_regex_boundaries_for_go(self):
+        text = GO + "\n" + "\n".join(f"// filler {i} " + "x" * 60 for i in range(30)) + "\n"
+        chunks = chunking.split_file("cmd/main.go", text)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertIn("First", chunks[0].metadata["symbols"])
+        self.assertTrue(any("Second" in c.metadata["symbols"] for c in chunks))
+        self.assertEqual("".join(c.page_content for c in chunks), text)
+
+
+class FallbackTest(unittest.TestCase):
+    def test_unparsable_python_falls_back_to_the_recursive_splitter(self):
+        text = "def broken(:\n" + "".join(f"    line_{i} = {i}\n" for i in range(200))
+        chunks = chunking.split_file("pkg/broken.py", text)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(c.metadata["chunker"] == "recursive" for c in chunks))
+        self.assertTrue(all(len(c.page_content) <= chunking.MAX_CHUNK_CHARS for c in chunks))
+
+    def test_unknown_extension_uses_the_recursive_splitter(self):
+        chunks = chunking.split_file("data/notes.xyz", "word " * 1000)
+        self.assertTrue(all(c.metadata["chunker"] == "recursive" for c in chunks))
+
+    def test_recursive_chunker_when_selected(self):
+        chunks = chunking.split_file("pkg/mod.py", PYTHON, chunker="recursive")
+        self.assertEqual([c.metadata["chunker"] for c in chunks], ["recursive"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+
+from utils import diff_utils
+
+# (path, expected kind)
+PATH_CASES = [
+    ("src/app.py", "source"),
+    ("main.go", "source"),
+    ("pyproject.toml", "source"),
+    ("requirements.txt", "source"),
+    ("requirements-dev.txt", "source"),
+    ("backend/requirements_test.txt", "source"),
+    ("CMakeLists.txt", "source"),
+    ("src/CMakeLists.txt", "source"),
+    ("notes.txt", "source"),
+    ("uv.lock", "config"),
+    ("dist/bundle.min.js", "config"),
+    ("config/settings.yaml", "config"),
+    (".gitignore", "config"),
+    ("tests/test_graph.py", "tests"),
+    ("test_main.py", "tests"),
+    ("web/app.spec.ts", "tests"),
+    ("README.md", "docs"),
+    ("README.txt", "docs"),
+    ("CHANGELOG", "docs"),
+    ("LICENSE", "docs"),
+    ("LICENSE.txt", "docs"),
+    ("docs/index.md", "docs"),
+    ("docs/conf.py", "docs"),
+    ("docs/_static/logo.svg", "docs"),
+    ("guide/usage.rst", "docs"),
+]
+
+# (changed files, expected kind for the whole change)
+CHANGE_CASES = [
+    ([], "none"),
+    (["README.md", "docs/setup.md"], "docs"),
+    (["CMakeLists.txt"], "source"),
+    (["requirements-dev.txt", "README.md"], "source"),
+    (["tests/test_a.py", "tests/test_b.py"], "tests"),
+    (["uv.lock", ".github/workflows/ci.yml"], "config"),
+    (["tests/test_a.py", "README.md"], "mixed"),
+    (["src/app.py", "README.md", "tests/test_app.py"], "source"),
+]
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_classify_path(self):
+        for path, expected in PATH_CASES:
+            with self.subTest(path=path):
+                self.assertEqual(diff_utils.classify_path(path), expected)
+
+    def test_classify_change(self):
+        for files, expected in CHANGE_CASES:
+            with self.subTest(files=files):
+                self.assertEqual(diff_utils.classify_change(files), expected)
+
+
+def change(filename, lines=10, width=40):
+    patch = "\n".join("+" + "x" * width for _ in range(lines))
+    return {"filename": filename, "patch": patch, "additions": lines, "deletions": 0}
+
+
+class PackDiffTest(unittest.TestCase):
+    def test_stays_within_budget_and_overflows_whole_files(self):
+        files = [change(f"src/mod{i}.py") for i in range(10)] + [change("uv.lock", lines=200)]
+        text, overflow = diff_utils.pack_diff({"messages": ["One", "Two"], "files": files}, token_budget=400)
+
+        self.assertLessEqual(diff_utils.estimate_tokens(text), 400)
+        self.assertTrue(text.startswith("Commits:\n- One\n- Two"))
+        packed = [f["filename"] for f in files if f"File: {f['filename']}\n" in text]
+        self.assertEqual(sorted(packed + [f["filename"] for f in overflow]), sorted(f["filename"] for f in files))
+        # Lockfiles rank last, so they are the first to overflow.
+        self.assertIn("uv.lock", [f["filename"] for f in overflow])
+        for f in files:
+            if f["filename"] in packed:
+                self.assertIn(f["patch"], text)
+
+    def test_lists_files_without_a_patch(self):
+        files = [change("src/app.py"), {"filename": "logo.png", "patch": None}]
+        text, overflow = diff_utils.pack_diff({"files": files}, token_budget=1000)
+
+        self.assertEqual(overflow, [])
+        self.assertIn("Other changed files (binary or too large to diff): logo.png", text)
+
+
+class GroupChangesTest(unittest.TestCase):
+    def test_groups_fit_the_budget(self):
+        changes = [change(f"src/mod{i}.py") for i in range(12)]
+        groups, leftover = diff_utils.group_changes(changes, token_budget=300, max_groups=10)
+
+        self.assertGreater(len(groups), 1)
+        self.assertEqual(leftover, [])
+        for group in groups:
+            self.assertLessEqual(diff_utils.estimate_tokens(group), 300)
+        self.assertEqual(sum(g.count("File: ") for g in groups), 12)
+
+    def test_changes_past_max_groups_are_left_over(self):
+        changes = [change(f"src/mod{i}.py") for i in range(12)]
+        groups, leftover = diff_utils.group_changes(changes, token_budget=300, max_groups=2)
+
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(sum(g.count("File: ") for g in groups) + len(leftover), 12)
+        self.assertEqual(leftover, [c["filename"] for c in changes[-len(leftover):]])
+
+    def test_huge_patch_is_clipped_into_one_group(self):
+        groups, leftover = diff_utils.group_changes([change("src/big.py", lines=500)], token_budget=300)
+
+        self.assertEqual(len(groups), 1)
+        self.assertLessEqual(diff_utils.estimate_tokens(groups[0]), 300)
+        self.assertIn("more lines]", groups[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from utils import markdown_sections
+
+# (audit bullet, expected section)
+CLASSIFY_CASES = [
+    ("Batched embedding pipeline", "features"),
+    ("Async GitHub client", "features"),
+    ("Rate-limit mitigation and backoff", "features"),
+    ("Commit range comparison", "features"),
+    ("Pipelined fetches", "features"),
+    ("Stacked diff summaries", "features"),
+    ("**Installation**: mention `uv sync`", "installation"),
+    ("How to install with pip install -e .", "installation"),
+    ("Usage: run `python main.py owner/repo`", "usage"),
+    ("Document the new --list-checkpoints CLI flag", "usage"),
+    ("Add examples for the scheduler", "usage"),
+    ("Environment variables AGENT_CHECKPOINTS and AGENT_CHECKPOINT_DB", "configuration"),
+    ("New langgraph-checkpoint-sqlite dependency", "tech stack"),
+    ("Uses the Chroma library for vectors", "tech stack"),
+    ("Contributors should open pull requests against main", "contributing"),
+    ("Project is released under the MIT License", "license"),
+]
+
+README = """# Project
+
+Intro paragraph.
+
+## Key Features
+
+- Old feature
+
+## Installation
+
+
+pip install project
+
+## License
+
+MIT
+"""
+
+
+class ClassifyItemTest(unittest.TestCase):
+    def test_table(self):
+        for item, expected in CLASSIFY_CASES:
+            with self.subTest(item=item):
+                self.assertEqual(markdown_sections.classify_item(item), expected)
+
+
+class SpliceTest(unittest.TestCase):
+    def test_untouched_text_is_kept_byte_for_byte(self):
+        sections = markdown_sections.parse_sections(README)
+        features = markdown_sections.find_section(sections, "features")
+        new_text = "## Key Features\n\n- Old feature\n- New feature"
+        result = markdown_sections.splice(README, [(features, new_text)])
+
+        self.assertEqual(result, README.replace("- Old feature\n", "- Old feature\n- New feature\n"))
+
+    def test_new_sections_go_before_license(self):
+        result = markdown_sections.splice(README, [], ["## Usage\n\nRun it."])
+
+        self.assertTrue(result.startswith(README[:README.index("## License")]))
+        self.assertIn("## Usage\n\nRun it.\n\n## License\n\nMIT\n", result)
+
+    def test_feature_bullets_never_patch_license(self):
+        patches, additions = markdown_sections.plan_patches(
+            README, "- Rate-limit mitigation and backoff\n- Batched embedding pipeline"
+        )
+
+        self.assertEqual([s.title for s, _ in patches], ["Key Features"])
+        self.assertEqual(additions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from utils import chunking, rag_utils
+
+
+class MergeChunksTest(unittest.TestCase):
+    def test_pieces_of_one_oversized_line_are_all_kept(self):
+        # Minified code: one line several chunks long, between two ordinary lines.
+        minified = "!function(){" + ",".join(f"f{i}(x{i})" for i in range(500)) + "}();\n"
+        text = "// header\n" + minified + "export const b = 1;\n"
+        chunks = chunking.split_file("dist/app.js", text)
+        pieces = [c for c in chunks if "piece" in c.metadata]
+        self.assertGreater(len(pieces), 1)
+
+        context = rag_utils.pack_context([list(reversed(chunks))], token_budget=10_000)
+
+        self.assertTrue(minified.strip() in context, "part of the minified line was dropped")
+        self.assertEqual(context.count("File: dist/app.js"), len(rag_utils._merge_chunks(chunks)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import unittest
+
+import webhook
+
+SECRET = "s3cret"
+
+
+def push_payload(ref="refs/heads/main", deleted=False, after="b" * 40, files=("src/app.py",)):
+    return {
+        "ref": ref,
+        "after": after,
+        "deleted": deleted,
+        "repository": {"full_name": "owner/repo", "default_branch": "main"},
+        "commits": [{"message": "Change app", "added": [], "modified": list(files), "removed": []}],
+    }
+
+
+class FakeState(dict):
+    async def set(self, repo_name, sha):
+        self[repo_name] = sha
+
+
+class SignatureTest(unittest.TestCase):
+    def test_accepts_matching_signature(self):
+        body = json.dumps(push_payload()).encode("utf-8")
+        self.assertTrue(webhook.verify_signature(SECRET, body, webhook.sign(SECRET, body)))
+
+    def test_rejects_bad_or_missing_signatures(self):
+        body = b'{"ref": "refs/heads/main"}'
+        for header in [webhook.sign("other", body), webhook.sign(SECRET, body + b" "), None, "sha1=abc"]:
+            with self.subTest(header=header):
+                self.assertFalse(webhook.verify_signature(SECRET, body, header))
+        self.assertFalse(webhook.verify_signature("", body, webhook.sign("", body)))
+
+
+class ParsePushTest(unittest.TestCase):
+    def test_default_branch_push(self):
+        push = webhook.parse_push(push_payload(files=("src/app.py", "README.md")))
+        self.assertEqual(push["repo"], "owner/repo")
+        self.assertEqual(push["sha"], "b" * 40)
+        self.assertEqual(push["files"], ["README.md", "src/app.py"])
+
+    def test_ignores_other_refs_and_deletions(self):
+        for payload in [
+            push_payload(ref="refs/heads/feature"),
+            push_payload(ref="refs/tags/v1.0"),
+            push_payload(deleted=True),
+            {"ref": "refs/heads/main"},
+        ]:
+            with self.subTest(ref=payload.get("ref"), deleted=payload.get("deleted")):
+                self.assertIsNone(webhook.parse_push(payload))
+
+
+class DispatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.state = FakeState()
+        self.queue = asyncio.Queue()
+        self.pending = set()
+        self.dispatcher = webhook.PushDispatcher(self.state, self.queue, self.pending, debounce=0.05)
+
+    async def test_burst_of_pushes_queues_one_run_at_the_newest_head(self):
+        for sha in ("1" * 40, "2" * 40, "3" * 40):
+            self.dispatcher.push(webhook.parse_push(push_payload(after=sha)))
+            await asyncio.sleep(0.01)
+        self.assertTrue(self.queue.empty())
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(self.queue.get_nowait(), ("owner/repo", "3" * 40, None))
+        self.assertEqual(self.pending, {"owner/repo"})
+
+    async def test_docs_only_push_moves_the_state_without_a_run(self):
+        self.dispatcher.push(webhook.parse_push(push_payload(files=("README.md",))))
+        await asyncio.sleep(0.1)
+
+        self.assertTrue(self.queue.empty())
+        self.assertEqual(self.state["owner/repo"], "b" * 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
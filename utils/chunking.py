@@ -0,0 +1,208 @@
+"""Language-aware chunking for the RAG index. `python -m utils.chunking <dir> [--index]` compares chunkers."""
+import ast
+import os
+import re
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# "structural" (default) or "recursive" (the original fixed 1500/200 splitter).
+CHUNKER = os.getenv("CHUNKER", "structural")
+MAX_CHUNK_CHARS = 1500
+FALLBACK_OVERLAP = 200
+
+_fallback_splitter = RecursiveCharacterTextSplitter(chunk_size=MAX_CHUNK_CHARS, chunk_overlap=FALLBACK_OVERLAP)
+
+# Top-level definition starts, per extension. Group 1 is the symbol name.
+BOUNDARY_PATTERNS = {
+    ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs'): re.compile(
+        r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?(?:function\*?|class|interface|type|enum|const|let|var)\s+([A-Za-z_$][\w$]*)"
+    ),
+    ('.go',): re.compile(r"^(?:func|type)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"),
+    ('.rs',): re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:fn|struct|enum|trait|impl|mod|type)\s+(?:<[^>]*>\s*)?([A-Za-z_]\w*)"),
+    ('.java', '.kt', '.cs', '.scala'): re.compile(
+        r"^(?:(?:public|private|protected|internal|abstract|final|static|sealed|data|open)\s+)*(?:class|interface|enum|record|object|fun)\s+([A-Za-z_]\w*)"
+    ),
+    ('.rb',): re.compile(r"^(?:def|class|module)\s+([A-Za-z_][\w.?!]*)"),
+    ('.md', '.mdx', '.rst'): re.compile(r"^#{1,3}\s+(.+?)\s*#*$"),
+}
+
+
+class _Segment:
+    __slots__ = ("start", "end", "symbols")
+
+    def __init__(self, start, end, symbols):
+        self.start = start  # 1-based, inclusive
+        self.end = end
+        self.symbols = symbols
+
+
+def _python_segments(text, total):
+    """One segment per top-level def/class (decorators included), glue code in between."""
+    tree = ast.parse(text)
+    segments = []
+    line = 1
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        if start > line:
+            segments.append(_Segment(line, start - 1, []))
+        segments.append(_Segment(start, node.end_lineno, [node.name]))
+        line = node.end_lineno + 1
+    if line <= total:
+        segments.append(_Segment(line, total, []))
+    return segments
+
+def _pattern_segments(lines, pattern):
+    segments = []
+    start, symbols = 1, []
+    for number, line in enumerate(lines, 1):
+        match = pattern.match(line)
+        if match and number > start:
+            segments.append(_Segment(start, number - 1, symbols))
+            start, symbols = number, []
+        if match:
+            symbols = [match.group(1)]
+    segments.append(_Segment(start, len(lines), symbols))
+    return segments
+
+def _segments_for(path, text, lines):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".py":
+        try:
+            return _python_segments(text, len(lines))
+        except (SyntaxError, ValueError):
+            pass
+    for extensions, pattern in BOUNDARY_PATTERNS.items():
+        if ext in extensions:
+            return _pattern_segments(lines, pattern)
+    return None
+
+def _make_chunk(source, lines, start, end, symbols, kind):
+    return Document(
+        page_content="".join(lines[start - 1:end]),
+        metadata={
+            "source": source,
+            "symbols": ", ".join(symbols),
+            "start_line": start,
+            "end_line": end,
+            "chunker": kind,
+        },
+    )
+
+def _pieces(lines, segment):
+    """
+    A definition bigger than one chunk, as packing units: blocks between blank
+    lines, or single lines for blocks that are themselves too big.
+    """
+    pieces, start, size = [], segment.start, 0
+    for number in range(segment.start, segment.end + 1):
+        size += len(lines[number - 1])
+        if not lines[number - 1].strip() or number == segment.end:
+            if size > MAX_CHUNK_CHARS:
+                pieces.extend((n, n, len(lines[n - 1])) for n in range(start, number + 1))
+            else:
+                pieces.append((start, number, size))
+            start, size = number + 1, 0
+    return pieces
+
+def _recursive_chunks(source, text):
+    doc = Document(page_content=text, metadata={"source": source, "chunker": "recursive"})
+    return _fallback_splitter.split_documents([doc])
+
+def split_file(source, text, chunker=None):
+    """Splits one file into Documents; structural where the language is known, recursive otherwise."""
+    if (chunker or CHUNKER) != "structural":
+        return _recursive_chunks(source, text)
+
+    lines = text.splitlines(keepends=True)
+    segments = _segments_for(source, text, lines) if lines else None
+    if segments is None:
+        return _recursive_chunks(source, text)
+
+    chunks = []
+    pending = None  # consecutive units packed into one chunk
+    pending_size = 0
+
+    def flush():
+        nonlocal pending, pending_size
+        if pending and "".join(lines[pending.start - 1:pending.end]).strip():
+            chunks.append(_make_chunk(source, lines, pending.start, pending.end, pending.symbols, "structural"))
+        pending, pending_size = None, 0
+
+    for segment in segments:
+        size = sum(len(l) for l in lines[segment.start - 1:segment.end])
+        # Whole definitions are packed as they are; an oversized one is packed piece by
+        # piece, so it shares chunks with its neighbours instead of leaving short tails.
+        units = [(segment.start, segment.end, size)] if size <= MAX_CHUNK_CHARS else _pieces(lines, segment)
+        for start, end, unit_size in units:
+            if unit_size > MAX_CHUNK_CHARS:
+                # Minified/generated code can have single lines longer than a chunk.
+                flush()
+                chunk = _make_chunk(source, lines, start, end, segment.symbols, "structural")
+                for i, piece in enumerate(_fallback_splitter.split_text(chunk.page_content)):
+                    # Pieces share their line range; the index keeps them apart when they're merged.
+                    chunks.append(Document(page_content=piece, metadata=dict(chunk.metadata, piece=i)))
+                continue
+            if pending and pending_size + unit_size > MAX_CHUNK_CHARS:
+                flush()
+            if pending is None:
+                pending = _Segment(start, end, [])
+            pending.end = end
+            pending.symbols.extend(sym for sym in segment.symbols if sym not in pending.symbols)
+            pending_size += unit_size
+    flush()
+    return chunks
+
+
+def _compare(root, build_index=False):
+    """Chunk counts, embedded characters and (optionally) index build time for both chunkers."""
+    import tempfile
+    import time
+
+    # Under `python -m` this file is __main__; rag_utils reads the setting from utils.chunking.
+    from utils import chunking, github_utils, rag_utils
+
+    documents = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not github_utils._is_ignored_dir(d)]
+        for name in filenames:
+            path = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+            if not github_utils.is_indexable_path(path):
+                continue
+            with open(os.path.join(dirpath, name), "rb") as f:
+                text = github_utils._decode_text(f.read())
+            if text is not None:
+                documents.append({"source": path, "content": text})
+    documents = documents[:github_utils.MAX_FILES]
+    total_chars = sum(len(d["content"]) for d in documents)
+    print(f"{len(documents)} files, {total_chars} chars\n")
+
+    for mode in ("recursive", "structural"):
+        start = time.perf_counter()
+        chunks = [c for d in documents for c in split_file(d["source"], d["content"], mode)]
+        split_time = time.perf_counter() - start
+        embedded = sum(len(c.page_content) for c in chunks)
+        print(f"{mode:>10}: {len(chunks):5d} chunks, {embedded} chars embedded "
+              f"({embedded / max(total_chars, 1):.0%} of source), split in {split_time * 1000:.0f} ms")
+
+        if build_index:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp, "embeddings.sqlite")
+                rag_utils._embeddings = None  # fresh, empty embedding cache for a fair timing
+                rag_utils.DB_PATH = os.path.join(tmp, "chroma_db")
+                chunking.CHUNKER = mode
+                start = time.perf_counter()
+                rag_utils.index_codebase(documents, "compare")
+                print(f"{'':>10}  index built in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the structural and recursive chunkers on a directory.")
+    parser.add_argument("root")
+    parser.add_argument("--index", action="store_true", help="also time a full index build (needs the embedding model)")
+    args = parser.parse_args()
+    _compare(args.root, args.index)
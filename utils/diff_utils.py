@@ -0,0 +1,154 @@
+import fnmatch
+import math
+import os
+
+# Rough token estimate for code; good enough to keep prompts under budget.
+CHARS_PER_TOKEN = 4
+DIFF_TOKEN_BUDGET = int(os.getenv("DIFF_TOKEN_BUDGET", 1500))
+# At most this many per-group summaries run for one changelog, so latency stays bounded.
+MAX_SUMMARY_GROUPS = int(os.getenv("DIFF_MAX_SUMMARY_GROUPS", 6))
+
+LOCKFILES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'uv.lock',
+    'Cargo.lock', 'Gemfile.lock', 'composer.lock', 'go.sum', 'Pipfile.lock'
+}
+GENERATED_MARKERS = ('.min.js', '.min.css', '.map', '.snap', '_pb2.py', '.pb.go', '.generated.')
+GENERATED_DIRS = {'dist', 'build', 'vendor', 'node_modules', 'generated', '__snapshots__'}
+TEST_DIRS = {'test', 'tests', '__tests__', 'spec'}
+DOC_EXTENSIONS = ('.md', '.rst')
+DOC_DIRS = {'docs', 'doc'}
+# README.txt, LICENSE, CHANGELOG; other .txt files (CMakeLists.txt, notes) are not docs.
+DOC_PREFIXES = ('README', 'CHANGELOG', 'LICENSE')
+CONFIG_EXTENSIONS = ('.json', '.yaml', '.yml', '.toml', '.ini', '.cfg')
+# Config that decides how the project is installed or run, so the README may need to follow it.
+MANIFEST_FILES = {
+    'pyproject.toml', 'setup.py', 'setup.cfg', 'requirements.txt', 'package.json', 'Cargo.toml',
+    'go.mod', 'Gemfile', 'Dockerfile', 'docker-compose.yml', 'Makefile', '.env.example', 'CMakeLists.txt'
+}
+MANIFEST_PATTERNS = ('requirements*.txt',)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _is_manifest(name):
+    return name in MANIFEST_FILES or any(fnmatch.fnmatch(name, p) for p in MANIFEST_PATTERNS)
+
+def _is_doc(dirs, name):
+    return name.endswith(DOC_EXTENSIONS) or name.upper().startswith(DOC_PREFIXES) or bool(DOC_DIRS.intersection(dirs))
+
+def file_weight(filename):
+    """How much a file's changes matter for a changelog: source > config/tests/docs > generated/lockfiles."""
+    *dirs, name = filename.split("/")
+    if name in LOCKFILES or any(m in name for m in GENERATED_MARKERS) or GENERATED_DIRS.intersection(dirs):
+        return 0.1
+    if TEST_DIRS.intersection(dirs) or name.startswith("test_") or ".test." in name or ".spec." in name:
+        return 0.5
+    if _is_doc(dirs, name) or name.endswith(CONFIG_EXTENSIONS):
+        return 0.6
+    return 1.0
+
+def classify_path(filename):
+    """'tests', 'docs', 'config' or 'source'. Manifests, lockfiles aside, count as source."""
+    *dirs, name = filename.split("/")
+    if _is_manifest(name):
+        return "source"
+    if name in LOCKFILES or any(m in name for m in GENERATED_MARKERS) or GENERATED_DIRS.intersection(dirs):
+        return "config"
+    if TEST_DIRS.intersection(dirs) or name.startswith("test_") or ".test." in name or ".spec." in name:
+        return "tests"
+    if _is_doc(dirs, name):
+        return "docs"
+    if name.endswith(CONFIG_EXTENSIONS) or name.startswith("."):
+        return "config"
+    return "source"
+
+def classify_change(filenames):
+    """
+    One kind for a whole change: 'source' if any source file changed, else the
+    single category of every file, else 'mixed' (e.g. tests and docs). 'none' if empty.
+    """
+    kinds = {classify_path(f) for f in filenames}
+    if not kinds:
+        return "none"
+    if "source" in kinds:
+        return "source"
+    return kinds.pop() if len(kinds) == 1 else "mixed"
+
+def rank_changes(files):
+    """Most important file changes first: category weight, scaled by the size of the change."""
+    def score(change):
+        lines = (change.get("additions") or 0) + (change.get("deletions") or 0)
+        return file_weight(change["filename"]) * math.log2(2 + lines)
+    return sorted(files, key=score, reverse=True)
+
+def render_change(change):
+    return f"\nFile: {change['filename']}\nDiff:\n{change['patch']}\n"
+
+def _commit_header(messages):
+    subjects = [m.splitlines()[0] for m in messages if m.strip()]
+    if len(subjects) <= 1:
+        return ""
+    return "Commits:\n" + "\n".join(f"- {s}" for s in subjects) + "\n"
+
+def pack_diff(commit_range, token_budget=DIFF_TOKEN_BUDGET):
+    """
+    Packs whole file patches, most important first, into the token budget.
+    Returns (packed_text, overflow) where overflow holds the ranked changes
+    that didn't fit. Patches are never cut mid-file.
+    """
+    parts = [_commit_header(commit_range.get("messages", []))]
+    used = estimate_tokens(parts[0])
+    overflow = []
+    without_patch = []
+
+    for change in rank_changes(commit_range.get("files", [])):
+        if not change.get("patch"):
+            without_patch.append(change["filename"])
+            continue
+        text = render_change(change)
+        cost = estimate_tokens(text)
+        if used + cost <= token_budget:
+            parts.append(text)
+            used += cost
+        else:
+            overflow.append(change)
+
+    if without_patch:
+        parts.append("\nOther changed files (binary or too large to diff): " + ", ".join(without_patch) + "\n")
+    return "".join(parts).strip(), overflow
+
+def _clip_patch(change, token_budget):
+    """Keeps a single huge patch inside one group, cut at a line boundary."""
+    limit = token_budget * CHARS_PER_TOKEN
+    patch = change["patch"]
+    if len(patch) <= limit:
+        return change
+    kept = patch[:limit].rsplit("\n", 1)[0]
+    dropped = patch.count("\n") - kept.count("\n")
+    return {**change, "patch": f"{kept}\n[... {dropped} more lines]"}
+
+def group_changes(changes, token_budget=DIFF_TOKEN_BUDGET, max_groups=MAX_SUMMARY_GROUPS):
+    """
+    Splits overflow changes into at most `max_groups` groups of rendered diff text,
+    each within the token budget. Returns (groups, leftover_filenames).
+    """
+    groups = []
+    current, used = [], 0
+    leftover = []
+
+    for change in changes:
+        text = render_change(_clip_patch(change, token_budget - 50))
+        cost = estimate_tokens(text)
+        if current and used + cost > token_budget:
+            groups.append("".join(current))
+            current, used = [], 0
+        if len(groups) == max_groups:
+            leftover.append(change["filename"])
+            continue
+        current.append(text)
+        used += cost
+
+    if current and len(groups) < max_groups:
+        groups.append("".join(current))
+    return groups, leftover
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from utils import metrics
+from utils.cache_store import SQLiteLRUStore
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "living-document", "embeddings.sqlite")
+DEFAULT_CACHE_MAX_MB = 512
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with a persistent cache keyed by (model name, chunk-text hash).
+    The cache lives outside the repo's DB, so it is shared across commits, branches and repos.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, store: SQLiteLRUStore):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _key(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        cached = self.store.get_many(keys)
+
+        # Only embed each unseen text once, even if it shows up several times in the batch.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            start = time.perf_counter()
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            metrics.count(embedding_batches=1, embedded_texts=len(missing), embedding_seconds=time.perf_counter() - start)
+            fresh = {key: array("f", vec).tobytes() for key, vec in zip(missing, vectors)}
+            self.store.set_many(fresh)
+            cached.update(fresh)
+
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        metrics.count(embedding_cache_hits=len(texts) - len(missing))
+
+        return [array("f", cached[key]).tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def open_embedding_cache(underlying, model_name):
+    path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+    max_mb = float(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    store = SQLiteLRUStore(path, max_bytes=int(max_mb * 1024 * 1024))
+    return CachedEmbeddings(underlying, model_name, store)
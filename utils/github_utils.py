@@ -1,6 +1,16 @@
+import base64
 import datetime
+import subprocess
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
-from github import Github, Auth, Repository, GithubException
+
+import requests
+from github import Github, Auth, Repository, GithubException, InputGitTreeElement
+
+from utils import diff_utils, metrics
+from utils.http_cache import CountingHTTPSConnection, caching_connection_class, open_http_cache
 
 def extract_repo_path(url_or_path: str) -> str:
     """Cleans up the input URL to get 'owner/repo'."""
@@ -13,106 +23,320 @@ def extract_repo_path(url_or_path: str) -> str:
     return path
 
 def connect_to_github(token: str) -> Github:
+    """
+    Builds the client. Unless GITHUB_HTTP_CACHE=0, GET responses are cached on disk and
+    revalidated with ETag/Last-Modified, so polling unchanged repos costs 304s only.
+    """
     auth = Auth.Token(token)
-    return Github(auth=auth)
+    g = Github(auth=auth)
+
+    # PyGithub has no public hook for the transport; this swaps the class it
+    # instantiates for this client only (not the global injectConnectionClasses).
+    if not hasattr(g.requester, "_Requester__connectionClass"):
+        raise RuntimeError(
+            "This PyGithub version has no Requester.__connectionClass; "
+            "the HTTP cache and API call counting need pygithub>=2.8.1,<3"
+        )
+    cache = open_http_cache()
+    if cache is not None:
+        store, tracker = cache
+        g.requester._Requester__connectionClass = caching_connection_class(store, tracker)
+    else:
+        g.requester._Requester__connectionClass = CountingHTTPSConnection
+    return g
+
+MAX_RANGE_MESSAGES = 100
 
-def fetch_latest_commit_diff(repo: Repository.Repository):
-    """Fetches the actual code changes (diff) for the Changelog."""
+def _file_change(file):
+    return {
+        "filename": file.filename,
+        "status": file.status,
+        "additions": file.additions,
+        "deletions": file.deletions,
+        "patch": file.patch or "",
+    }
+
+@metrics.instrumented("github.fetch_commit_range")
+def fetch_commit_range(repo: Repository.Repository, base_sha=None, head_sha=None):
+    """
+    Everything that changed in base..head, from a single compare request:
+    {"base", "head", "messages": [...], "files": [{"filename", "status", "additions", "deletions", "patch"}]}.
+    Without a base (first run) or when the compare fails (e.g. force-push), only the latest commit is used.
+    """
+    if base_sha and head_sha and base_sha != head_sha:
+        try:
+            comparison = repo.compare(base_sha, head_sha)
+            files = [_file_change(f) for f in comparison.files]
+            messages = [c.commit.message for c in comparison.commits[:MAX_RANGE_MESSAGES]]
+            return {"base": base_sha, "head": head_sha, "messages": messages, "files": files}
+        except Exception as e:
+            print(f"⚠️ Compare {base_sha[:7]}..{head_sha[:7]} failed ({e}). Using latest commit only.")
+
+    latest_commit = repo.get_commit(head_sha) if head_sha else repo.get_commits()[0]
+    return {
+        "base": None,
+        "head": latest_commit.sha,
+        "messages": [latest_commit.commit.message],
+        "files": [_file_change(f) for f in latest_commit.files],
+    }
+
+def fetch_latest_commit_diff(repo: Repository.Repository, commit_range=None):
+    """
+    Fetches the actual code changes (diff) for the Changelog, for a whole commit range if given.
+    Whole file patches are packed most-important-first into DIFF_TOKEN_BUDGET (see diff_utils).
+    """
     try:
-        latest_commit = repo.get_commits()[0]
-        diff_data = ""
-        for file in latest_commit.files:
-            if file.patch:
-                diff_data += f"\nFile: {file.filename}\nDiff:\n{file.patch}\n"
-        return diff_data[:5000] # Limit size
+        if commit_range is None:
+            commit_range = fetch_commit_range(repo)
+        packed, _ = diff_utils.pack_diff(commit_range)
+        return packed
     except:
         return ""
 
-def fetch_repo_file_structure(repo: Repository.Repository, limit_chars=20000):
+MAX_FILES = 300
+MAX_FILE_CHARS = 100000
+FETCH_WORKERS = 8
+
+IGNORED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.zip', '.tar', '.gz',
+    '.exe', '.dll', '.so', '.bin', '.pyc', '.class', '.jar',
+    '.map', '.log', '.lock'
+}
+
+IGNORED_FILES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'uv.lock',
+    '.DS_Store', '.gitignore', '.env', 'LICENSE', 'Dockerfile'
+}
+
+IGNORED_DIRS = {
+    'node_modules', 'venv', 'env', 'dist', 'build', 'target',
+    '__pycache__', '.git', '.github', '.vscode', '.idea'
+}
+
+def _is_ignored_dir(name: str) -> bool:
+    return name in IGNORED_DIRS or name.startswith('.')
+
+def _is_ignored_file(name: str) -> bool:
+    if name in IGNORED_FILES:
+        return True
+    _, ext = name.lower().rsplit('.', 1) if '.' in name else (None, '')
+    ext = f".{ext}" if ext else ""
+    return ext in IGNORED_EXTENSIONS
+
+def is_indexable_path(path: str) -> bool:
+    """Applies the directory/file ignore rules to a full repo-relative path."""
+    *dirs, name = path.split("/")
+    if any(_is_ignored_dir(d) for d in dirs):
+        return False
+    return not _is_ignored_file(name)
+
+def _decode_text(raw: bytes):
+    """Returns the UTF-8 text of a file, or None if it should not be indexed."""
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if not text.strip() or len(text) > MAX_FILE_CHARS:
+        return None
+    return text
+
+@metrics.instrumented("github.fetch_repo_file_structure")
+def fetch_repo_file_structure(repo: Repository.Repository, limit_chars=20000, mode="tree", ref=None, local_path=None):
     """
     Fetches ALL text-based files recursively.
     Includes smart filtering to skip massive lockfiles and binaries.
+
+    mode="tree"     -> one recursive Git Trees call + parallel blob downloads (default).
+    mode="archive"  -> one tarball download, text files extracted in memory.
+    mode="local"    -> reads a local working tree or bare repo at `ref`, no network.
+    mode="contents" -> legacy per-directory walk over the contents API.
+    """
+    if mode == "contents":
+        return _fetch_via_contents(repo)
+    if mode == "tree":
+        return _fetch_via_git_tree(repo, ref or repo.default_branch)
+    if mode == "archive":
+        return _fetch_via_archive(repo, ref or repo.default_branch)
+    if mode == "local":
+        if not local_path:
+            raise ValueError("mode='local' needs local_path")
+        return _fetch_via_local_checkout(repo, local_path, ref or "HEAD")
+    raise ValueError(f"Unknown fetch mode: {mode}")
+
+def _select_candidates(entries):
+    """
+    Filters (path, size, sha) entries through the ignore rules and orders them
+    the way the breadth-first walk visits files, so MAX_FILES keeps the same picks.
+    """
+    candidates = [
+        (path, sha) for path, size, sha in entries
+        if (size or 0) <= MAX_FILE_CHARS * 4 and is_indexable_path(path)
+    ]
+    candidates.sort(key=lambda c: (c[0].count("/"), c[0]))
+    return candidates
+
+def _collect_documents(candidates, load_window):
+    """
+    Loads candidates in windows sized to the remaining budget, so skipped
+    (binary/empty) files don't cost us slots and we never load far past MAX_FILES.
+    `load_window` takes a list of (path, sha) and returns their texts (or None).
     """
     documents = []
-    queue = list(repo.get_contents(""))
-    
-    files_processed = 0
-    MAX_FILES = 300
-    
-    ignored_extensions = {
-        '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.zip', '.tar', '.gz',
-        '.exe', '.dll', '.so', '.bin', '.pyc', '.class', '.jar',
-        '.map', '.log', '.lock' 
-    }
-    
-    ignored_files = {
-        'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'uv.lock',
-        '.DS_Store', '.gitignore', '.env', 'LICENSE', 'Dockerfile'
-    }
-    
-    ignored_dirs = {
-        'node_modules', 'venv', 'env', 'dist', 'build', 'target', 
-        '__pycache__', '.git', '.github', '.vscode', '.idea'
-    }
+    pos = 0
+    while pos < len(candidates) and len(documents) < MAX_FILES:
+        window = candidates[pos:pos + MAX_FILES - len(documents)]
+        pos += len(window)
+        for (path, _), text in zip(window, load_window(window)):
+            if text is not None:
+                documents.append({"source": path, "content": text})
+    return documents
+
+def _fetch_via_contents(repo: Repository.Repository):
+    documents = []
+    queue = deque(repo.get_contents(""))
+
+    while queue and len(documents) < MAX_FILES:
+        file_content = queue.popleft()
 
-    while queue and files_processed < MAX_FILES:
-        file_content = queue.pop(0)
-        
         if file_content.type == "dir":
-            if file_content.name in ignored_dirs or file_content.name.startswith('.'):
+            if _is_ignored_dir(file_content.name):
                 continue
             queue.extend(repo.get_contents(file_content.path))
         else:
-            if file_content.name in ignored_files:
+            if _is_ignored_file(file_content.name):
                 continue
-            
-            _, ext = file_content.name.lower().rsplit('.', 1) if '.' in file_content.name else (None, '')
-            ext = f".{ext}" if ext else ""
-            
-            if ext in ignored_extensions:
-                continue
-
             try:
-                text = file_content.decoded_content.decode("utf-8")
-                if not text.strip() or len(text) > 100000:
-                    continue
-                documents.append({"source": file_content.path, "content": text})
-                files_processed += 1
-            except UnicodeDecodeError:
-                pass 
+                text = _decode_text(file_content.decoded_content)
             except Exception:
-                pass
-            
+                continue
+            if text is not None:
+                documents.append({"source": file_content.path, "content": text})
+
     return documents
 
-def create_multi_file_pr(repo: Repository.Repository, file_updates: list, title: str, body: str):
-    """
-    Creates a PR with MULTIPLE file changes (README + CHANGELOG).
-    Includes verbose logging and safe error handling.
-    """
-    default_branch = repo.get_branch(repo.default_branch)
-    branch_name = f"docs/update-{datetime.datetime.now().strftime('%Y-%m-%d-%H%M%S')}"
-    
-    print(f"   🔹 Creating branch: {branch_name}...", flush=True)
-    repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=default_branch.commit.sha)
-    
-    for file in file_updates:
-        print(f"   🔹 Committing: {file['path']}...", flush=True)
+def _fetch_via_git_tree(repo: Repository.Repository, ref: str):
+    tree = repo.get_git_tree(ref, recursive=True)
+    if tree.truncated:
+        print("⚠️ Git tree listing truncated by GitHub. Falling back to contents walk...")
+        return _fetch_via_contents(repo)
+
+    candidates = _select_candidates(
+        (entry.path, entry.size, entry.sha) for entry in tree.tree if entry.type == "blob"
+    )
+
+    def download(candidate):
         try:
-            contents = repo.get_contents(file['path'], ref=branch_name)
-            repo.update_file(file['path'], f"Update {file['path']}", file['content'], contents.sha, branch=branch_name)
-            print(f"      ✓ Updated existing file")
+            blob = repo.get_git_blob(candidate[1])
+            raw = base64.b64decode(blob.content) if blob.encoding == "base64" else blob.content.encode("utf-8")
+            return _decode_text(raw)
         except GithubException as e:
+            # A blob that vanished is skipped; anything else (auth, rate limit, network) fails the fetch.
             if e.status == 404:
-                repo.create_file(file['path'], f"Create {file['path']}", file['content'], branch=branch_name)
-                print(f"      ✓ Created new file")
-            else:
-                print(f"❌ Error committing {file['path']}: {e}")
-                raise e 
-        except Exception as e:
-            print(f"❌ Unexpected error committing {file['path']}: {e}")
-            raise e
-        
+                return None
+            raise
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        download = metrics.propagate(download)
+        return _collect_documents(candidates, lambda window: pool.map(download, window))
+
+def _fetch_via_archive(repo: Repository.Repository, ref: str):
+    url = repo.get_archive_link("tarball", ref=ref)
+    texts = {}
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        # "r|gz" reads the archive as a stream: nothing is written to disk
+        # and members are seen once, in archive order.
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Tarballs are rooted at "<owner>-<repo>-<sha>/".
+                path = member.name.split("/", 1)[-1]
+                if member.size > MAX_FILE_CHARS * 4 or not is_indexable_path(path):
+                    continue
+                text = _decode_text(archive.extractfile(member).read())
+                if text is not None:
+                    texts[path] = text
+                if len(texts) > MAX_FILES * 2:
+                    # Keep memory bounded on big repos: only the first MAX_FILES in walk order can win.
+                    keep = _select_candidates((p, 0, None) for p in texts)[:MAX_FILES]
+                    texts = {p: texts[p] for p, _ in keep}
+
+    candidates = _select_candidates((path, 0, None) for path in texts)
+    return _collect_documents(candidates, lambda window: [texts[path] for path, _ in window])
+
+def _git(local_path, *args, input=None):
+    result = subprocess.run(
+        ["git", "-C", local_path, *args], input=input, capture_output=True, check=True
+    )
+    return result.stdout
+
+def _read_git_blobs(local_path, shas):
+    """Reads many blobs with a single `git cat-file --batch` process."""
+    output = _git(local_path, "cat-file", "--batch", input="".join(f"{sha}\n" for sha in shas).encode())
+    blobs = []
+    pos = 0
+    for _ in shas:
+        header_end = output.index(b"\n", pos)
+        header = output[pos:header_end].split()
+        if header[-1] == b"missing":
+            blobs.append(None)
+            pos = header_end + 1
+            continue
+        size = int(header[2])
+        blobs.append(output[header_end + 1:header_end + 1 + size])
+        pos = header_end + 1 + size + 1
+    return blobs
+
+def _fetch_via_local_checkout(repo: Repository.Repository, local_path: str, ref: str):
+    try:
+        _git(local_path, "cat-file", "-e", f"{ref}^{{commit}}")
+    except subprocess.CalledProcessError:
+        print(f"⚠️ {ref[:7]} not found in {local_path}. Falling back to Git Trees fetch...")
+        return _fetch_via_git_tree(repo, ref)
+
+    # Works for working trees and bare repos alike: reads the commit, not the checkout.
+    listing = _git(local_path, "ls-tree", "-r", "-l", "-z", ref).decode("utf-8", "replace")
+    entries = []
+    for line in filter(None, listing.split("\0")):
+        meta, path = line.split("\t", 1)
+        _, kind, sha, size = meta.split()
+        if kind == "blob":
+            entries.append((path, int(size) if size.isdigit() else 0, sha))
+
+    def load_window(window):
+        return [
+            _decode_text(raw) if raw is not None else None
+            for raw in _read_git_blobs(local_path, [sha for _, sha in window])
+        ]
+
+    return _collect_documents(_select_candidates(entries), load_window)
+
+@metrics.instrumented("github.create_multi_file_pr")
+def create_multi_file_pr(repo: Repository.Repository, file_updates: list, title: str, body: str, base_sha=None):
+    """
+    Creates a PR with MULTIPLE file changes (README + CHANGELOG) as ONE commit.
+    Uses the Git Data API: one tree (file contents inline), one commit, one ref,
+    one PR, so the number of API calls doesn't grow with the number of files.
+    """
+    if base_sha is None:
+        base_sha = get_current_commit_sha(repo)
+    base_commit = repo.get_git_commit(base_sha)
+    branch_name = f"docs/update-{datetime.datetime.now().strftime('%Y-%m-%d-%H%M%S')}"
+
+    print(f"   🔹 Committing {len(file_updates)} file(s): {', '.join(f['path'] for f in file_updates)}...", flush=True)
+    try:
+        tree = repo.create_git_tree(
+            [InputGitTreeElement(f['path'], "100644", "blob", content=f['content']) for f in file_updates],
+            base_tree=base_commit.tree
+        )
+        commit = repo.create_git_commit(title, tree, [base_commit])
+        print(f"   🔹 Creating branch: {branch_name} @ {commit.sha[:7]}...", flush=True)
+        repo.create_git_ref(ref=f"refs/heads/{branch_name}", sha=commit.sha)
+    except GithubException as e:
+        print(f"❌ Error committing updates: {e}")
+        raise e
+
     print("   🔹 Opening Pull Request...", flush=True)
     pr = repo.create_pull(
         title=title,
@@ -126,27 +350,40 @@ def get_current_commit_sha(repo):
     branch = repo.get_branch(repo.default_branch)
     return branch.commit.sha
 
-def should_ignore_commit(repo):
+def ignore_reason(messages, filenames):
     """
-    Returns True if the latest commit should NOT trigger an update.
+    The skip rules on plain data, so callers that already hold the commits
+    (e.g. a push webhook payload) don't need extra API calls.
+    Returns why the change should be ignored, or None.
     Criteria:
-    1. Message contains '[skip ci]'
-    2. Message starts with 'docs:' (Agent's own commits)
-    3. The commit ONLY modified .md files
-    """
-    latest_commit = repo.get_commits()[0]
-    message = latest_commit.commit.message.lower()
-    
-    if "[skip ci]" in message or message.startswith("docs:"):
-        print("Ignoring commit: Marked as docs/skip-ci.")
-        return True
-        
-    try:
-        is_docs_only = all(f.filename.endswith('.md') for f in latest_commit.files)
-        if is_docs_only:
-            print("Ignoring commit: Only documentation changed.")
-            return True 
-    except:
-        pass
+    1. Every message contains '[skip ci]' or starts with 'docs:' (Agent's own commits)
+    2. The change ONLY modified .md files
+    """
+    messages = [m.lower() for m in messages]
+    if messages and all("[skip ci]" in m or m.startswith("docs:") for m in messages):
+        return "Marked as docs/skip-ci."
+    if all(f.endswith('.md') for f in filenames):
+        return "Only documentation changed."
+    return None
+
+def should_ignore_commit(repo, commit_range=None):
+    """
+    Returns True if the latest commit (or the whole commit range, if given)
+    should NOT trigger an update (see ignore_reason).
+    """
+    if commit_range is not None:
+        messages = commit_range["messages"]
+        filenames = [f["filename"] for f in commit_range["files"]]
+    else:
+        latest_commit = repo.get_commits()[0]
+        messages = [latest_commit.commit.message]
+        try:
+            filenames = [f.filename for f in latest_commit.files]
+        except:
+            filenames = [""]  # Unknown file list: never treat as docs-only.
         
-    return False
\ No newline at end of file
+    reason = ignore_reason(messages, filenames)
+    if reason:
+        print(f"Ignoring commit: {reason}")
+        return True
+    return False
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from github.Requester import HTTPSRequestsConnectionClass
+
+from utils import metrics
+from utils.cache_store import SQLiteLRUStore
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "living-document", "github_http.sqlite")
+DEFAULT_CACHE_MAX_MB = 256
+# Start spreading requests out once less than this share of the hourly quota is left.
+RATE_LIMIT_LOW_WATERMARK = 0.1
+MAX_BACKOFF_SECONDS = 60
+
+
+class RateLimitTracker:
+    """Remembers the last X-RateLimit-* headers and paces requests when the quota runs low."""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, response):
+        headers = response.headers
+        with self._lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.limit = int(headers.get("X-RateLimit-Limit", 0)) or self.limit
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                self.reset_at = float(headers.get("X-RateLimit-Reset", 0)) or self.reset_at
+            if response.status_code in (403, 429):
+                retry_after = headers.get("Retry-After")
+                if retry_after:
+                    self._blocked_until = time.time() + float(retry_after)
+                elif self.remaining == 0 and self.reset_at:
+                    self._blocked_until = self.reset_at
+
+    def delay(self):
+        """Seconds to wait before the next request that will count against the quota."""
+        now = time.time()
+        with self._lock:
+            if self._blocked_until > now:
+                return min(self._blocked_until - now, MAX_BACKOFF_SECONDS)
+            if not self.limit or self.remaining is None or not self.reset_at:
+                return 0.0
+            if self.remaining >= self.limit * RATE_LIMIT_LOW_WATERMARK:
+                return 0.0
+            # Spread what is left evenly over the rest of the window.
+            window = max(self.reset_at - now, 0)
+            return min(window / max(self.remaining, 1), MAX_BACKOFF_SECONDS)
+
+
+class ConditionalCacheAdapter(HTTPAdapter):
+    """
+    requests adapter that stores GET responses with their ETag/Last-Modified,
+    sends conditional requests, and answers 304s from the stored copy.
+    GitHub doesn't count 304s against the rate limit, so unchanged polls are free.
+    """
+
+    def __init__(self, store: SQLiteLRUStore, tracker: RateLimitTracker, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.tracker = tracker
+
+    def _key(self, request):
+        # Cached bodies are per token: never serve one token's response to another.
+        auth = hashlib.sha256(request.headers.get("Authorization", "").encode()).hexdigest()
+        accept = request.headers.get("Accept", "")
+        return hashlib.sha256(f"{request.url}\n{accept}\n{auth}".encode()).hexdigest()
+
+    def send(self, request, stream=False, **kwargs):
+        cacheable = request.method == "GET" and not stream
+        key = self._key(request) if cacheable else None
+        cached = self._load(key) if cacheable else None
+
+        if cached is not None:
+            headers = cached["headers"]
+            if "ETag" in headers:
+                request.headers["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                request.headers["If-Modified-Since"] = headers["Last-Modified"]
+        else:
+            wait = self.tracker.delay()
+            if wait > 0:
+                time.sleep(wait)
+
+        response = super().send(request, stream=stream, **kwargs)
+        self.tracker.update(response)
+
+        if cached is not None and response.status_code == 304:
+            metrics.count(github_not_modified=1)
+            return self._from_cache(request, response, cached)
+
+        if cacheable and response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            self._save(key, response)
+        return response
+
+    def _load(self, key):
+        raw = self.store.get(key)
+        if raw is None:
+            return None
+        meta, body = raw.split(b"\0", 1)
+        return {"headers": json.loads(meta), "body": body}
+
+    def _save(self, key, response):
+        meta = json.dumps(dict(response.headers)).encode("utf-8")
+        self.store.set(key, meta + b"\0" + response.content)
+
+    def _from_cache(self, request, not_modified, cached):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.headers = CaseInsensitiveDict(cached["headers"])
+        # Keep fresh rate-limit/date headers from the 304.
+        response.headers.update(not_modified.headers)
+        response._content = cached["body"]
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+
+def open_http_cache():
+    """Returns the shared (SQLiteLRUStore, RateLimitTracker) pair, or None when GITHUB_HTTP_CACHE=0."""
+    if os.getenv("GITHUB_HTTP_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    path = os.getenv("GITHUB_HTTP_CACHE_PATH", DEFAULT_CACHE_PATH)
+    max_mb = float(os.getenv("GITHUB_HTTP_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    return SQLiteLRUStore(path, max_bytes=int(max_mb * 1024 * 1024)), RateLimitTracker()
+
+
+class CountingHTTPSConnection(HTTPSRequestsConnectionClass):
+    """PyGithub's connection class, counting every request in the run metrics."""
+
+    def getresponse(self):
+        metrics.count(github_api_calls=1)
+        return super().getresponse()
+
+
+def caching_connection_class(store: SQLiteLRUStore, tracker: RateLimitTracker):
+    """Builds a PyGithub connection class whose requests session goes through ConditionalCacheAdapter."""
+
+    class CachingHTTPSConnection(CountingHTTPSConnection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.adapter = ConditionalCacheAdapter(
+                store,
+                tracker,
+                max_retries=self.retry,
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+            )
+            self.session.mount("https://", self.adapter)
+
+    return CachingHTTPSConnection
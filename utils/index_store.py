@@ -0,0 +1,208 @@
+"""
+Per-repo vector indexes on disk, with file locks and an LRU disk budget.
+
+    indexes/
+      registry.json          key -> {"dir", "last_used", "bytes"}
+      <dir>/                 Chroma DB + manifest + lexical index for one repo
+      locks/<dir>.lock       shared while reading, exclusive while building/evicting
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no file locks, so concurrent processes must not share an INDEX_STORE_DIR.
+    fcntl = None
+
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", "indexes")
+INDEX_STORE_MAX_MB = float(os.getenv("INDEX_STORE_MAX_MB", 2048))
+REGISTRY_FILE = "registry.json"
+# Written last by rag_utils.index_codebase; a directory without it is a build that failed.
+MANIFEST_FILE = "manifest.json"
+
+
+def index_key(repo_name, branch=None):
+    return f"{repo_name}@{branch}" if branch else repo_name
+
+@contextlib.contextmanager
+def _flock(path, exclusive):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _try_exclusive(path):
+    """Opens and exclusively locks `path` without waiting. Returns the file, or None if it's in use."""
+    f = open(path, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+    except BlockingIOError:
+        f.close()
+        return None
+
+def _lock_path(root, directory):
+    return os.path.join(root, "locks", f"{directory}.lock")
+
+def _dir_bytes(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+@contextlib.contextmanager
+def _registry(root):
+    """Read-modify-write access to the registry, serialized across processes."""
+    with _flock(os.path.join(root, "locks", "registry.lock"), exclusive=True):
+        path = os.path.join(root, REGISTRY_FILE)
+        try:
+            with open(path, "r") as f:
+                registry = json.load(f)
+        except (OSError, ValueError):
+            registry = {}
+        yield registry
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(registry, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+def _new_dir(key):
+    # A new directory name per build: Chroma caches clients by path, so a deleted
+    # path is never reopened within a process.
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", key)[:60]
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}-{uuid.uuid4().hex[:6]}"
+
+def _complete(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            json.load(f)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def _entry_for(root, key, create):
+    with _registry(root) as registry:
+        entry = registry.get(key)
+        if entry is None and create:
+            entry = registry[key] = {"dir": _new_dir(key), "bytes": 0}
+        if entry is not None:
+            entry["last_used"] = time.time()
+        return dict(entry) if entry else None
+
+@contextlib.contextmanager
+def building(repo_name, branch=None, root=None):
+    """
+    Yields the repo's index directory under an exclusive lock (created if needed).
+    Afterwards its size is recorded and other indexes are evicted to fit the budget.
+    """
+    root = root or INDEX_STORE_DIR
+    key = index_key(repo_name, branch)
+    entry = _entry_for(root, key, create=True)
+    path = os.path.join(root, entry["dir"])
+    with contextlib.ExitStack() as locks:
+        locks.enter_context(_flock(_lock_path(root, entry["dir"]), exclusive=True))
+        if os.path.isdir(path) and not _complete(path):
+            # An earlier build failed half way. Its Chroma client may still be cached in
+            # this process, so deleting and reopening the same path fails: build elsewhere.
+            new_dir = _new_dir(key)
+            locks.enter_context(_flock(_lock_path(root, new_dir), exclusive=True))
+            with _registry(root) as registry:
+                registry[key] = {**registry.get(key, entry), "dir": new_dir, "bytes": 0}
+            shutil.rmtree(path, ignore_errors=True)
+            with contextlib.suppress(OSError):
+                os.remove(_lock_path(root, entry["dir"]))
+            path = os.path.join(root, new_dir)
+        yield path
+        size = _dir_bytes(path)
+    with _registry(root) as registry:
+        if key in registry:
+            registry[key]["bytes"] = size
+    evict(root=root, keep=key)
+
+@contextlib.contextmanager
+def reading(repo_name, branch=None, root=None):
+    """Yields the repo's index directory under a shared lock, or None if it has no index."""
+    root = root or INDEX_STORE_DIR
+    entry = _entry_for(root, index_key(repo_name, branch), create=False)
+    if entry is None:
+        yield None
+        return
+    with _flock(_lock_path(root, entry["dir"]), exclusive=False):
+        path = os.path.join(root, entry["dir"])
+        yield path if os.path.isdir(path) else None
+
+@contextlib.asynccontextmanager
+async def areading(repo_name, branch=None, root=None):
+    """reading() for async code: the locks are waited for in a thread, not on the event loop."""
+    lock = reading(repo_name, branch, root)
+    path = await asyncio.to_thread(lock.__enter__)
+    try:
+        yield path
+    finally:
+        await asyncio.to_thread(lock.__exit__, None, None, None)
+
+def evict(max_bytes=None, root=None, keep=None):
+    """
+    Deletes least recently used indexes until the store fits `max_bytes`.
+    Indexes that are being read or built are skipped. Returns the evicted keys.
+    """
+    root = root or INDEX_STORE_DIR
+    max_bytes = INDEX_STORE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    victims = []
+    with _registry(root) as registry:
+        total = sum(e.get("bytes", 0) for e in registry.values())
+        for key, entry in sorted(registry.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= max_bytes:
+                break
+            if key == keep:
+                continue
+            lock = _try_exclusive(_lock_path(root, entry["dir"]))
+            if lock is None:
+                continue
+            victims.append((key, entry["dir"], lock))
+            total -= entry.get("bytes", 0)
+        for key, _, _ in victims:
+            del registry[key]
+
+    # Unregistered and exclusively locked: nobody else can open these, so delete
+    # them without holding up the registry.
+    for _, directory, lock in victims:
+        try:
+            shutil.rmtree(os.path.join(root, directory), ignore_errors=True)
+        finally:
+            lock.close()
+        with contextlib.suppress(OSError):
+            os.remove(_lock_path(root, directory))
+    evicted = [key for key, _, _ in victims]
+    if evicted:
+        print(f"Index store: evicted {', '.join(evicted)} to stay under {max_bytes / 1024 / 1024:.0f} MB.")
+    return evicted
+
+def list_indexes(root=None):
+    """[(key, entry)] most recently used first."""
+    root = root or INDEX_STORE_DIR
+    if not os.path.exists(os.path.join(root, REGISTRY_FILE)):
+        return []
+    with _registry(root) as registry:
+        return sorted(registry.items(), key=lambda item: item[1].get("last_used", 0), reverse=True)
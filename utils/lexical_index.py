@@ -0,0 +1,149 @@
+import json
+import math
+import os
+import re
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_WORD = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_\-.]*")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text):
+    """
+    Lowercased terms, keeping whole identifiers *and* their parts, so
+    `fetch_repo_file_structure`, `--dry-run` and `runAgent` match both exactly and by word.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        word = word.strip("-.")
+        if len(word) < 2:
+            continue
+        terms.append(word.lower())
+        parts = [p.lower() for chunk in re.split(r"[_\-.]+", word) for p in _CAMEL.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1)
+    return terms
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over the same chunks (and ids) as the Chroma collection."""
+
+    def __init__(self):
+        self.chunks = {}    # id -> {"text", "metadata", "length"}
+        self.postings = {}  # term -> {id: term frequency}
+        self.total_length = 0
+
+    def add(self, ids, documents):
+        for chunk_id, doc in zip(ids, documents):
+            if chunk_id in self.chunks:
+                self.remove([chunk_id])
+            terms = tokenize(doc.page_content)
+            self.chunks[chunk_id] = {"text": doc.page_content, "metadata": doc.metadata, "length": len(terms)}
+            self.total_length += len(terms)
+            for term in terms:
+                posting = self.postings.setdefault(term, {})
+                posting[chunk_id] = posting.get(chunk_id, 0) + 1
+
+    def remove(self, ids):
+        for chunk_id in ids:
+            chunk = self.chunks.pop(chunk_id, None)
+            if chunk is None:
+                continue
+            self.total_length -= chunk["length"]
+            for term in set(tokenize(chunk["text"])):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def search(self, query, k=5):
+        """Returns [(id, score)] by BM25, best first."""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        avg_length = self.total_length / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, tf in posting.items():
+                length = self.chunks[chunk_id]["length"]
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def document(self, chunk_id):
+        chunk = self.chunks[chunk_id]
+        return Document(id=chunk_id, page_content=chunk["text"], metadata=chunk["metadata"])
+
+    def save(self, path):
+        # Postings are rebuilt on load; only the chunks need to hit disk.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({cid: {"text": c["text"], "metadata": c["metadata"]} for cid, c in self.chunks.items()}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with open(path, "r") as f:
+            chunks = json.load(f)
+        index.add(
+            list(chunks),
+            [Document(page_content=c["text"], metadata=c["metadata"]) for c in chunks.values()]
+        )
+        return index
+
+
+def is_identifier_query(query):
+    """Short queries made of code-looking tokens (snake_case, camelCase, --flags, dotted.names)."""
+    words = query.strip().split()
+    if not words or len(words) > 3:
+        return False
+    return all(
+        "_" in w or w.startswith("-") or "." in w.strip(".") or "(" in w
+        or (any(c.isupper() for c in w[1:]) and any(c.islower() for c in w))
+        for w in words
+    )
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 and vector results with reciprocal rank fusion. Identifier-style
+    queries are answered from the lexical index alone, with no embedding call.
+    """
+
+    vectorstore: Any
+    lexical: Any
+    k: int = 5
+    fetch_k: int = 20
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        lexical_hits = self.lexical.search(query, self.fetch_k)
+        if lexical_hits and is_identifier_query(query):
+            return [self.lexical.document(chunk_id) for chunk_id, _ in lexical_hits[:self.k]]
+
+        vector_docs = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        fused = {}
+        docs = {}
+        for rank, doc in enumerate(vector_docs):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1 / (RRF_K + rank + 1)
+            docs[doc.id] = doc
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (RRF_K + rank + 1)
+            if chunk_id not in docs:
+                docs[chunk_id] = self.lexical.document(chunk_id)
+
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[chunk_id] for chunk_id in best]
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+import threading
+
+from utils.cache_store import SQLiteLRUStore
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "living-document", "llm_responses.sqlite")
+DEFAULT_CACHE_MAX_MB = 64
+DEFAULT_CACHE_TTL_HOURS = 24 * 7
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM generations keyed by the rendered prompt
+    (system + human messages), model name and temperature.
+    """
+
+    def __init__(self, store: SQLiteLRUStore):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(messages, model, temperature):
+        payload = json.dumps(
+            {"messages": [[m.type, m.content] for m in messages], "model": model, "temperature": temperature},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self.store.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key, text):
+        self.store.set(key, text.encode("utf-8"))
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def open_llm_cache():
+    """Returns the configured response cache, or None when LLM_CACHE=0."""
+    if os.getenv("LLM_CACHE", "1").lower() in ("0", "false", "no"):
+        return None
+    path = os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+    max_mb = float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    ttl_hours = float(os.getenv("LLM_CACHE_TTL_HOURS", DEFAULT_CACHE_TTL_HOURS))
+    store = SQLiteLRUStore(path, max_bytes=int(max_mb * 1024 * 1024), ttl_seconds=ttl_hours * 3600)
+    return LLMResponseCache(store)
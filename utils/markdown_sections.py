@@ -0,0 +1,179 @@
+"""Markdown section parsing and splicing for section-level README patches."""
+import re
+
+_ATX = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_SETEXT = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+
+# Canonical section -> heading titles that count as that section, and audit keywords that target it.
+# Keywords match whole words; a trailing * makes one a stem ("librar*" matches "library", "libraries").
+SECTION_ALIASES = {
+    "features": ("key features", "features", "main features", "highlights"),
+    "tech stack": ("tech stack", "technologies", "built with", "stack", "requirements", "dependencies"),
+    "installation": ("installation", "install", "getting started", "setup", "set up"),
+    "usage": ("usage", "how to use", "quick start", "quickstart", "examples", "running"),
+    "configuration": ("configuration", "config", "environment variables", "settings"),
+    "contributing": ("contributing", "contribute", "contribution"),
+    "license": ("license", "licence", "licensing"),
+}
+SECTION_KEYWORDS = {
+    "license": ("license", "licence", "mit license", "apache license", "apache 2.0", "apache-2.0"),
+    "contributing": ("contribut*", "pull request", "pull requests", "fork"),
+    "installation": ("install", "installation", "installing", "setup", "set up", "pip install",
+                     "requirements.txt", "prerequisite", "prerequisites"),
+    "usage": ("usage", "how to run", "command line", "command-line", "cli", "example", "examples"),
+    "configuration": ("config", "configuration", "configure", "environment variable", "environment variables",
+                      "env var", "env vars", "setting", "settings"),
+    "tech stack": ("tech stack", "framework", "frameworks", "librar*", "dependenc*", "language", "languages"),
+}
+SECTION_TITLES = {
+    "features": "Key Features", "tech stack": "Tech Stack", "installation": "Installation", "usage": "Usage",
+    "configuration": "Configuration", "contributing": "Contributing", "license": "License",
+}
+# Where brand-new sections go, relative to each other; License stays last.
+SECTION_ORDER = ["features", "tech stack", "installation", "usage", "configuration", "contributing", "license"]
+
+
+class Section:
+    __slots__ = ("level", "title", "start", "body_start", "end")
+
+    def __init__(self, level, title, start, body_start):
+        self.level = level
+        self.title = title
+        self.start = start            # offset of the heading line
+        self.body_start = body_start  # offset just after the heading (and setext underline)
+        self.end = None               # offset of the next heading at the same or a higher level
+
+    def __repr__(self):
+        return f"Section({self.level}, {self.title!r}, {self.start}:{self.end})"
+
+
+def parse_sections(text):
+    """Headings (ATX and setext) outside code fences, each spanning its subsections."""
+    sections = []
+    offset = 0
+    in_fence = None
+    lines = text.splitlines(keepends=True)
+    previous = None  # (line, offset) of the last plain paragraph line, for setext headings
+
+    for line in lines:
+        stripped = line.rstrip("\r\n")
+        fence = _FENCE.match(stripped)
+        if in_fence:
+            if fence and fence.group(1) == in_fence:
+                in_fence = None
+        elif fence:
+            in_fence = fence.group(1)
+        elif (atx := _ATX.match(stripped)):
+            sections.append(Section(len(atx.group(1)), atx.group(2).strip(), offset, offset + len(line)))
+            previous = None
+            offset += len(line)
+            continue
+        elif previous and _SETEXT.match(stripped):
+            title, start = previous
+            sections.append(Section(1 if stripped.strip()[0] == "=" else 2, title, start, offset + len(line)))
+            previous = None
+            offset += len(line)
+            continue
+        previous = (stripped.strip(), offset) if stripped.strip() and not in_fence and not fence else None
+        offset += len(line)
+
+    for i, section in enumerate(sections):
+        section.end = next((s.start for s in sections[i + 1:] if s.level <= section.level), len(text))
+    return sections
+
+def normalize_title(title):
+    return re.sub(r"[^a-z0-9 ]+", "", title.lower()).strip()
+
+def find_section(sections, key):
+    """The section whose title matches one of the aliases of `key`; exact matches win."""
+    aliases = SECTION_ALIASES.get(key, (key,))
+    titles = [(s, normalize_title(s.title)) for s in sections]
+    for alias in aliases:
+        for section, title in titles:
+            if title == alias:
+                return section
+    for alias in aliases:
+        for section, title in titles:
+            if re.search(rf"\b{re.escape(alias)}\b", title):
+                return section
+    return None
+
+def parse_missing_items(missing):
+    """Bullet/numbered items from the audit's output (continuation lines folded in)."""
+    items = []
+    for line in missing.splitlines():
+        match = re.match(r"^\s*(?:[-*+]|\d+[.)])\s+(.*)", line)
+        if match:
+            items.append(match.group(1).strip())
+        elif line.strip() and items and line.startswith((" ", "\t")):
+            items[-1] += " " + line.strip()
+    return [i for i in items if i]
+
+def _keyword_pattern(keyword):
+    if keyword.endswith("*"):
+        return rf"\b{re.escape(keyword[:-1])}"
+    return rf"\b{re.escape(keyword)}\b"
+
+def classify_item(item):
+    """Which canonical section an audit item belongs to; new features are the default."""
+    text = item.lower()
+    for key, aliases in SECTION_ALIASES.items():
+        if any(re.match(rf"{re.escape(alias)}\b", text.strip("*: ")) for alias in aliases):
+            return key
+    for key, keywords in SECTION_KEYWORDS.items():
+        if any(re.search(_keyword_pattern(k), text) for k in keywords):
+            return key
+    return "features"
+
+def plan_patches(readme, missing):
+    """
+    Maps the audit's items to README sections.
+    Returns (patches, additions): patches is [(Section, items)] for sections that
+    exist, additions is [(key, items)] for sections that have to be written.
+    Nested targets are folded into the enclosing section.
+    """
+    sections = parse_sections(readme)
+    grouped = {}
+    for item in parse_missing_items(missing):
+        grouped.setdefault(classify_item(item), []).append(item)
+
+    patches, additions = {}, []
+    for key in sorted(grouped, key=lambda k: SECTION_ORDER.index(k) if k in SECTION_ORDER else len(SECTION_ORDER)):
+        section = find_section(sections, key)
+        if section is None:
+            additions.append((key, grouped[key]))
+        else:
+            patches.setdefault(section, []).extend(grouped[key])
+
+    for inner in list(patches):
+        outer = next((s for s in patches if s is not inner and s.start <= inner.start and inner.end <= s.end), None)
+        if outer is not None:
+            patches[outer].extend(patches.pop(inner))
+    return list(patches.items()), additions
+
+def heading_level(readme):
+    """Level new sections should use: the most common one below the title."""
+    levels = [s.level for s in parse_sections(readme) if s.level > 1]
+    return max(set(levels), key=levels.count) if levels else 2
+
+def splice(text, replacements, appended=()):
+    """
+    Replaces [(Section, new_text)] in `text` and appends new sections before a trailing
+    License section (or at the end). Everything outside the replaced spans is kept byte-for-byte.
+    """
+    for section, new_text in sorted(replacements, key=lambda r: r[0].start, reverse=True):
+        old = text[section.start:section.end]
+        # Keep the original blank lines between this section and the next.
+        trailing = old[len(old.rstrip()):]
+        text = text[:section.start] + new_text.rstrip() + trailing + text[section.end:]
+
+    if appended:
+        block = "\n\n".join(a.strip() for a in appended)
+        license_section = find_section(parse_sections(text), "license")
+        if license_section is not None and license_section.end == len(text):
+            at = license_section.start
+            text = text[:at] + block + "\n\n" + text[at:]
+        else:
+            text = text.rstrip("\n") + "\n\n" + block + "\n"
+    return text
@@ -0,0 +1,208 @@
+"""
+Per-run, per-node metrics: wall time, GitHub API calls, embedding batches, LLM tokens.
+Each run appends to a JSONL trace and rewrites a Prometheus textfile for its repo.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+METRICS_ENABLED = os.getenv("AGENT_METRICS", "1").lower() not in ("0", "false", "no")
+METRICS_DIR = os.getenv("AGENT_METRICS_DIR", "metrics")
+TRACE_FILE = os.getenv("AGENT_TRACE_FILE", os.path.join(METRICS_DIR, "trace.jsonl"))
+# Point this at the node exporter's --collector.textfile.directory.
+PROM_DIR = os.getenv("AGENT_PROM_DIR", METRICS_DIR)
+
+COUNTERS = (
+    "github_api_calls", "github_not_modified",
+    "embedding_batches", "embedded_texts", "embedding_cache_hits", "embedding_seconds",
+    "llm_calls", "llm_cache_hits", "prompt_tokens", "completion_tokens", "llm_seconds",
+)
+
+_run = contextvars.ContextVar("metrics_run", default=None)
+_node = contextvars.ContextVar("metrics_node", default=None)
+
+
+class RunMetrics:
+    """Counters for one agent run, bucketed by the graph node that caused them."""
+
+    def __init__(self, repo_name):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.repo = repo_name
+        self.started = time.time()
+        self.finished = None
+        self.ok = None
+        self.head = None
+        self.nodes = {}
+        self.skipped = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, node):
+        if node not in self.nodes:
+            self.nodes[node] = {"seconds": 0.0, "calls": {}, **{c: 0 for c in COUNTERS}}
+        return self.nodes[node]
+
+    def add(self, node, **counters):
+        with self._lock:
+            entry = self._entry(node)
+            for name, value in counters.items():
+                entry[name] += value
+
+    def add_call(self, node, name, seconds):
+        with self._lock:
+            call = self._entry(node)["calls"].setdefault(name, {"count": 0, "seconds": 0.0})
+            call["count"] += 1
+            call["seconds"] += seconds
+
+    def node_summary(self, node):
+        entry = self.nodes[node]
+        rate = entry["completion_tokens"] / entry["llm_seconds"] if entry["llm_seconds"] else 0.0
+        return {**entry, "tokens_per_sec": round(rate, 2)}
+
+
+def start_run(repo_name):
+    """Starts collecting for the current task. Returns (run, token) for finish_run; run is None when disabled."""
+    if not METRICS_ENABLED:
+        return None, None
+    run = RunMetrics(repo_name)
+    return run, _run.set(run)
+
+def finish_run(run, token, ok, head=None):
+    if run is None:
+        return
+    _run.reset(token)
+    run.finished = time.time()
+    run.ok = bool(ok)
+    run.head = head
+    try:
+        write_trace(run)
+        write_prometheus(run)
+    except OSError as e:
+        print(f"⚠️ Warning: Could not write metrics: {e}")
+
+def enter_node(name):
+    return _node.set(name)
+
+def exit_node(token, name, start, end):
+    _node.reset(token)
+    run = _run.get()
+    if run is not None:
+        run.add(name, seconds=end - start)
+
+def count(**counters):
+    """Adds to the current run's counters, under the node that is running (if any)."""
+    run = _run.get()
+    if run is not None:
+        run.add(_node.get() or "(run)", **counters)
+
+def skip(stage, reason):
+    """Records that a graph stage didn't run this time, and why."""
+    run = _run.get()
+    if run is not None:
+        run.skipped[stage] = reason
+
+def record_llm(prompt_tokens, completion_tokens, seconds):
+    count(llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, llm_seconds=seconds)
+
+def instrumented(name):
+    """Decorator: counts calls and time spent in a function, per node."""
+    def decorate(fn):
+        def record(start):
+            run = _run.get()
+            if run is not None:
+                run.add_call(_node.get() or "(run)", name, time.perf_counter() - start)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record(start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(start)
+        return wrapper
+    return decorate
+
+def propagate(fn):
+    """Wraps `fn` for a thread pool so its calls are counted under the submitting run and node."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def _trace_records(run):
+    base = {"run_id": run.run_id, "repo": run.repo}
+    for node in run.nodes:
+        yield {**base, "type": "node", "node": node, **run.node_summary(node)}
+    totals = {c: sum(e[c] for e in run.nodes.values()) for c in COUNTERS}
+    yield {
+        **base, "type": "run", "head": run.head, "ok": run.ok,
+        "started_at": run.started, "seconds": round(run.finished - run.started, 4),
+        "skipped": run.skipped, **totals,
+    }
+
+def write_trace(run, path=None):
+    path = path or TRACE_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        for record in _trace_records(run):
+            f.write(json.dumps(record) + "\n")
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(run):
+    """The last run of one repo in Prometheus text exposition format."""
+    repo = _label(run.repo)
+    per_node = [("node_duration_seconds", "seconds", "Wall time of each graph node.")]
+    per_node += [(c, c, f"{c.replace('_', ' ').capitalize()} during the node.") for c in COUNTERS]
+    per_node += [("tokens_per_second", "tokens_per_sec", "Completion tokens per second of LLM time.")]
+
+    lines = []
+    for metric, field, help_text in per_node:
+        lines.append(f"# HELP living_document_{metric} {help_text}")
+        lines.append(f"# TYPE living_document_{metric} gauge")
+        for node in run.nodes:
+            value = run.node_summary(node)[field]
+            lines.append(f'living_document_{metric}{{repo="{repo}",node="{_label(node)}"}} {value}')
+    for metric, value, help_text in (
+        ("run_duration_seconds", run.finished - run.started, "Wall time of the last run."),
+        ("run_success", int(bool(run.ok)), "1 if the last run finished."),
+        ("last_run_timestamp_seconds", run.finished, "When the last run finished."),
+    ):
+        lines.append(f"# HELP living_document_{metric} {help_text}")
+        lines.append(f"# TYPE living_document_{metric} gauge")
+        lines.append(f'living_document_{metric}{{repo="{repo}"}} {value}')
+    if run.skipped:
+        lines.append("# HELP living_document_stage_skipped 1 for each graph stage the last run skipped.")
+        lines.append("# TYPE living_document_stage_skipped gauge")
+        for stage, reason in run.skipped.items():
+            lines.append(f'living_document_stage_skipped{{repo="{repo}",stage="{_label(stage)}",reason="{_label(reason)}"}} 1')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(run, directory=None):
+    """One .prom file per repo, replaced atomically so the exporter never reads half a file."""
+    directory = directory or PROM_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"living_document_{re.sub(r'[^A-Za-z0-9_.-]+', '_', run.repo)}.prom")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus(run))
+    os.replace(tmp_path, path)
@@ -1,80 +1,311 @@
+import json
 import os
 import shutil
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document 
+
+from utils import chunking, metrics
+from utils.cache_store import blob_sha
+from utils.diff_utils import estimate_tokens
+from utils.embedding_cache import open_embedding_cache
+from utils.lexical_index import HybridRetriever, LexicalIndex
+
+DB_PATH = "./chroma_db"
+COLLECTION_NAME = "repo_codebase"
+MANIFEST_FILE = "manifest.json"
+LEXICAL_FILE = "lexical_index.json"
+EMBEDDING_MODEL = "mxbai-embed-large:latest"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 4))
+# Roughly what the old single query's 5 raw chunks cost, so the audit prompt doesn't grow.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1800))
+
+_embeddings = None
+# db_path -> (commit, retriever), so reopening an index within one process is free.
+_retrievers = {}
 
 def get_embeddings_model():
-    return OllamaEmbeddings(model="mxbai-embed-large:latest")
+    """Shared embeddings model, wrapped in the persistent embedding cache."""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = open_embedding_cache(OllamaEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL)
+    return _embeddings
 
-def index_codebase(file_documents, current_sha):
-    """
-    Smart RAG: Checks if the DB matches the current Commit SHA.
-    If match -> Load (Fast).
-    If mismatch -> Rebuild (Slow).
-    """
-    db_path = "./chroma_db"
-    version_file = os.path.join(db_path, "version.txt")
-    
-    if os.path.exists(db_path) and os.path.exists(version_file):
+def _chunk_ids(source, count):
+    return [f"{source}::{i}" for i in range(count)]
+
+def _load_manifest(db_path):
+    manifest_file = os.path.join(db_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def _save_manifest(db_path, manifest):
+    manifest_file = os.path.join(db_path, MANIFEST_FILE)
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
+
+def _load_lexical(db_path, vectorstore):
+    """The BM25 index saved next to the collection, rebuilt from its stored chunks if missing."""
+    lexical_file = os.path.join(db_path, LEXICAL_FILE)
+    if os.path.exists(lexical_file):
         try:
-            with open(version_file, "r") as f:
-                cached_sha = f.read().strip()
-            
-            if cached_sha == current_sha:
-                print(f"RAG: Cache Hit! Loading existing DB for commit {current_sha[:7]}...")
-                vectorstore = Chroma(
-                    persist_directory=db_path,
-                    embedding_function=get_embeddings_model(),
-                    collection_name="repo_codebase"
-                )
-                return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
-            else:
-                print(f"RAG: Code changed ({cached_sha[:7]} -> {current_sha[:7]}). Rebuilding DB...")
-                shutil.rmtree(db_path)
-                time.sleep(1) # Wait for file lock release
+            return LexicalIndex.load(lexical_file)
         except Exception as e:
-            print(f"⚠️ Cache check failed ({e}). Rebuilding...")
-            if os.path.exists(db_path):
-                shutil.rmtree(db_path)
-
-    # 2. BUILD NEW DB
-    print(f"RAG: Creating NEW Vector DB from {len(file_documents)} files...")
-    
-    docs = [Document(page_content=d['content'], metadata={"source": d['source']}) for d in file_documents]
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    splits = splitter.split_documents(docs)
-    
+            print(f"⚠️ Lexical index unreadable ({e}). Rebuilding from the vector DB...")
+    lexical = LexicalIndex()
+    stored = vectorstore._collection.get(include=["documents", "metadatas"])
+    lexical.add(stored["ids"], [
+        Document(page_content=text, metadata=meta or {})
+        for text, meta in zip(stored["documents"], stored["metadatas"])
+    ])
+    return lexical
+
+def _open_vectorstore(db_path):
+    return Chroma(
+        persist_directory=db_path,
+        embedding_function=get_embeddings_model(),
+        collection_name=COLLECTION_NAME
+    )
+
+def _iter_batches(file_documents, hashes, entries):
+    """Lazily splits files and yields (ids, splits) batches of EMBED_BATCH_SIZE chunks."""
+    ids, splits = [], []
+    for d in file_documents:
+        file_splits = chunking.split_file(d['source'], d['content'])
+        entries[d['source']] = {"sha": hashes[d['source']], "chunks": len(file_splits)}
+        for chunk_id, split in zip(_chunk_ids(d['source'], len(file_splits)), file_splits):
+            ids.append(chunk_id)
+            splits.append(split)
+            if len(splits) == EMBED_BATCH_SIZE:
+                yield ids, splits
+                ids, splits = [], []
+    if splits:
+        yield ids, splits
+
+def _embed_files(vectorstore, lexical, file_documents, hashes):
+    """
+    Splits and embeds the given files. Returns {path: {"sha", "chunks"}} for the manifest.
+    Batches are embedded by EMBED_WORKERS threads and written to the collection
+    (and the lexical index) as soon as each one finishes, with at most 2x workers
+    batches held in memory.
+    """
+    embeddings = get_embeddings_model()
+    collection = vectorstore._collection
+    entries = {}
+
+    @metrics.propagate
+    def embed(batch):
+        ids, splits = batch
+        return ids, splits, embeddings.embed_documents([s.page_content for s in splits])
+
+    def write(future):
+        ids, splits, vectors = future.result()
+        collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[s.page_content for s in splits],
+            metadatas=[s.metadata for s in splits]
+        )
+        lexical.add(ids, splits)
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        in_flight = set()
+        for batch in _iter_batches(file_documents, hashes, entries):
+            in_flight.add(pool.submit(embed, batch))
+            if len(in_flight) >= EMBED_WORKERS * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future)
+        for future in as_completed(in_flight):
+            write(future)
+
+    return entries
+
+@metrics.instrumented("rag.index_codebase")
+def index_codebase(file_documents, current_sha, db_path=None):
+    """
+    Smart RAG: Keeps a manifest of path -> blob SHA next to the DB.
+    Unchanged files -> chunks are reused as-is (Fast).
+    Added/changed/removed files -> only their chunks are deleted/re-embedded.
+    `db_path` defaults to DB_PATH; the graph passes a per-repo directory (see index_store).
+    """
+    db_path = db_path or DB_PATH
+    embeddings = get_embeddings_model()
+    stats_before = embeddings.stats()
+    hashes = {d['source']: blob_sha(d['content']) for d in file_documents}
+
+    manifest = None
     if os.path.exists(db_path):
         try:
+            manifest = _load_manifest(db_path)
+        except Exception as e:
+            print(f"⚠️ Manifest unreadable ({e}). Rebuilding...")
+        if manifest is None:
+            # Legacy version.txt DB or a broken one: start over.
             shutil.rmtree(db_path)
-            time.sleep(1)
-        except:
-            pass
-
-    print(f"Saving database to: {os.path.abspath(db_path)}")
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=get_embeddings_model(),
-        collection_name="repo_codebase",
-        persist_directory=db_path
-    )
-    
-    # SAVE THE VERSION
+            time.sleep(1) # Wait for file lock release
+
+    if manifest is None:
+        print(f"RAG: Creating NEW Vector DB from {len(file_documents)} files...")
+        print(f"Saving database to: {os.path.abspath(db_path)}")
+        vectorstore = _open_vectorstore(db_path)
+        lexical = LexicalIndex()
+        files = _embed_files(vectorstore, lexical, file_documents, hashes)
+        reused = 0
+    else:
+        old_files = manifest.get("files", {})
+        vectorstore = _open_vectorstore(db_path)
+        lexical = _load_lexical(db_path, vectorstore)
+
+        stale = [p for p, entry in old_files.items() if hashes.get(p) != entry["sha"]]
+        fresh = [d for d in file_documents if old_files.get(d['source'], {}).get("sha") != hashes[d['source']]]
+
+        if not stale and not fresh:
+            print(f"RAG: Cache Hit! Loading existing DB for commit {current_sha[:7]}...")
+        else:
+            print(f"RAG: Code changed ({manifest.get('commit', '')[:7]} -> {current_sha[:7]}). "
+                  f"Updating {len(fresh)} files, dropping {len(stale)} stale files...")
+
+        stale_ids = [i for p in stale for i in _chunk_ids(p, old_files[p]["chunks"])]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+            lexical.remove(stale_ids)
+
+        files = {p: entry for p, entry in old_files.items() if p not in stale}
+        reused = sum(entry["chunks"] for entry in files.values())
+        files.update(_embed_files(vectorstore, lexical, fresh, hashes))
+
+    embedded = sum(entry["chunks"] for entry in files.values()) - reused
+    print(f"RAG: Reused {reused} chunks, re-embedded {embedded} chunks.")
+    stats_after = embeddings.stats()
+    print(f"RAG: Embedding cache {stats_after['hits'] - stats_before['hits']} hits, "
+          f"{stats_after['misses'] - stats_before['misses']} misses.")
+
     try:
-        with open(version_file, "w") as f:
-            f.write(current_sha)
+        lexical.save(os.path.join(db_path, LEXICAL_FILE))
+        _save_manifest(db_path, {"commit": current_sha, "files": files})
     except Exception as e:
-        print(f"⚠️ Warning: Could not save version file: {e}")
-    
-    return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+        print(f"⚠️ Warning: Could not save manifest: {e}")
+
+    # BM25 + vector fusion; identifier-style queries skip the embedding call entirely.
+    retriever = HybridRetriever(vectorstore=vectorstore, lexical=lexical, k=5)
+    _retrievers[db_path] = (current_sha, retriever)
+    return retriever
 
+def open_retriever(db_path):
+    """Retriever over an index built earlier by index_codebase (no embedding work)."""
+    manifest = _load_manifest(db_path)
+    if manifest is None:
+        _retrievers.pop(db_path, None)
+        raise FileNotFoundError(f"No index at {db_path}")
+    cached = _retrievers.get(db_path)
+    if cached is not None and cached[0] == manifest.get("commit"):
+        return cached[1]
+    vectorstore = _open_vectorstore(db_path)
+    retriever = HybridRetriever(vectorstore=vectorstore, lexical=_load_lexical(db_path, vectorstore), k=5)
+    _retrievers[db_path] = (manifest.get("commit"), retriever)
+    return retriever
+
+@metrics.instrumented("rag.query")
 def query_rag(retriever, query):
     """
     Searches the codebase for the answer to a specific question.
     """
     relevant_docs = retriever.invoke(query)
-    return "\n\n".join([f"File: {d.metadata['source']}\n{d.page_content}" for d in relevant_docs])
\ No newline at end of file
+    return "\n\n".join([f"File: {d.metadata['source']}\n{d.page_content}" for d in relevant_docs])
+
+def _line_span(doc):
+    """(start, end) lines if the chunk is exactly those lines of its file, else None."""
+    start, end = doc.metadata.get("start_line"), doc.metadata.get("end_line")
+    if "piece" in doc.metadata:
+        # Part of one oversized line: merged by text, not by (shared) line range.
+        return None
+    if not start or not end or len(doc.page_content.splitlines()) != end - start + 1:
+        return None
+    return start, end
+
+def _text_overlap(a, b, longest=400, shortest=20):
+    """Length of the longest suffix of `a` that is a prefix of `b` (splitter overlap)."""
+    for n in range(min(len(a), len(b), longest), shortest - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def _merge_chunks(docs):
+    """
+    Merges chunks of one file: overlapping/adjacent line ranges become one block,
+    and recursive-splitter chunks lose their repeated overlap. Returns texts in file order.
+    """
+    spans = sorted((span, d.page_content) for d in docs if (span := _line_span(d)))
+    others = [
+        d.page_content for d in sorted(
+            (d for d in docs if not _line_span(d)),
+            key=lambda d: (d.metadata.get("start_line") or 0, d.metadata.get("piece") or 0)
+        )
+    ]
+
+    blocks = []
+    for (start, end), text in spans:
+        if blocks and start <= blocks[-1][1] + 1:
+            last_start, last_end, last_text = blocks[-1]
+            if end > last_end:
+                last_text += "".join(text.splitlines(keepends=True)[last_end - start + 1:])
+            blocks[-1] = (last_start, max(end, last_end), last_text)
+        else:
+            blocks.append((start, end, text))
+    texts = [text for _, _, text in blocks]
+
+    for text in others:
+        if any(text in t for t in texts):
+            continue
+        for i, t in enumerate(texts):
+            if (n := _text_overlap(t, text)):
+                texts[i] = t + text[n:]
+                break
+            if (n := _text_overlap(text, t)):
+                texts[i] = text + t[n:]
+                break
+        else:
+            texts.append(text)
+    return texts
+
+def _render_context(selected):
+    by_source = {}
+    for doc in selected:
+        by_source.setdefault(doc.metadata['source'], []).append(doc)
+    return "\n\n".join(
+        f"File: {source}\n{text}" for source, docs in by_source.items() for text in _merge_chunks(docs)
+    )
+
+def pack_context(results, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Packs the results of several queries into one context string within the token budget.
+    Chunks are taken round-robin across queries (best of each first) so every
+    query gets coverage; duplicates and overlaps are merged before they are counted.
+    """
+    selected, seen = [], set()
+    for rank in range(max((len(r) for r in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            doc = docs[rank]
+            key = doc.id or (doc.metadata['source'], doc.page_content)
+            if key in seen:
+                continue
+            seen.add(key)
+            if estimate_tokens(_render_context(selected + [doc])) <= token_budget:
+                selected.append(doc)
+    return _render_context(selected)
+
+@metrics.instrumented("rag.build_context")
+async def abuild_context(retriever, queries, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Runs all queries as one concurrent batch and packs the deduped results."""
+    results = await retriever.abatch(list(queries))
+    return pack_context(results, token_budget)
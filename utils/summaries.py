@@ -0,0 +1,83 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+from utils.cache_store import SQLiteLRUStore, blob_sha
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "living-document", "summaries.sqlite")
+DEFAULT_CACHE_MAX_MB = 64
+# Off by default: the first run summarizes every file, which is one LLM call each.
+REPO_SUMMARIES = os.getenv("REPO_SUMMARIES", "").lower() in ("1", "true", "yes")
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 4))
+SUMMARY_FILE_CHARS = 6000
+
+
+def open_summary_store():
+    path = os.getenv("SUMMARY_CACHE_PATH", DEFAULT_CACHE_PATH)
+    max_mb = float(os.getenv("SUMMARY_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    return SQLiteLRUStore(path, max_bytes=int(max_mb * 1024 * 1024))
+
+def _parent(path):
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+def _listing(children):
+    return "\n".join(f"- {name}: {summary}" for name, summary in sorted(children.items()))
+
+def _summarize_missing(store, jobs, summarize, pool):
+    """jobs: {key: args}. Returns {key: summary}, calling `summarize` only for keys not in the store."""
+    found = {k: v.decode("utf-8") for k, v in store.get_many(list(jobs)).items()}
+    missing = [k for k in jobs if k not in found]
+    for key, summary in zip(missing, pool.map(metrics.propagate(lambda k: summarize(*jobs[k])), missing)):
+        store.set(key, summary.encode("utf-8"))
+        found[key] = summary
+    return found, len(missing)
+
+def build_overview(file_documents, summarize_file, summarize_directory, model="", store=None):
+    """
+    One-line summaries per file (keyed by blob SHA), rolled up per directory and
+    for the whole repo. A directory's key hashes its children's summaries, so after
+    a commit only the changed files and the directories above them are re-summarized.
+    Returns the repo summary followed by its top-level entries.
+    """
+    store = store or open_summary_store()
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as pool:
+        file_keys = {d['source']: f"file:{model}:{blob_sha(d['content'])}" for d in file_documents}
+        jobs = {file_keys[d['source']]: (d['source'], d['content'][:SUMMARY_FILE_CHARS]) for d in file_documents}
+        file_summaries, files_done = _summarize_missing(store, jobs, summarize_file, pool)
+
+        # children[dir] = {entry name: summary}, filled bottom-up.
+        children = {"": {}}
+        for path in file_keys:
+            directory = path
+            while directory:
+                children.setdefault(_parent(directory), {})
+                directory = _parent(directory)
+        for path, key in file_keys.items():
+            children[_parent(path)][path.rsplit("/", 1)[-1]] = file_summaries[key]
+
+        dirs_done = 0
+        for depth in sorted({d.count("/") for d in children if d}, reverse=True):
+            level = [d for d in children if d and d.count("/") == depth]
+            keys, jobs = {}, {}
+            for directory in level:
+                listing = _listing(children[directory])
+                keys[directory] = "dir:" + hashlib.sha256(f"{model}\0{directory}\0{listing}".encode("utf-8")).hexdigest()
+                jobs[keys[directory]] = (directory, listing)
+            # A directory holding a single entry is described by that entry.
+            single = {d for d in level if len(children[d]) == 1}
+            summaries, done = _summarize_missing(
+                store, {k: v for k, v in jobs.items() if v[0] not in single}, summarize_directory, pool
+            )
+            dirs_done += done
+            for directory in level:
+                summary = next(iter(children[directory].values())) if directory in single else summaries[keys[directory]]
+                children[_parent(directory)][directory.rsplit("/", 1)[-1] + "/"] = summary
+
+        listing = _listing(children[""])
+        root_key = "dir:" + hashlib.sha256(f"{model}\0\0{listing}".encode("utf-8")).hexdigest()
+        root, done = _summarize_missing(store, {root_key: ("(repository root)", listing)}, summarize_directory, pool)
+        dirs_done += done
+
+    print(f"Summaries: regenerated {files_done}/{len(file_keys)} files, {dirs_done}/{len(children)} directories.")
+    return f"{root[root_key]}\n\n{listing}"
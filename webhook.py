@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+os.environ.setdefault("AGENT_QUIET", "1")
+
+import utils.github_utils as github_utils
+import scheduler
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+# Pushes to the same repo within this window collapse into one agent run.
+DEBOUNCE_SECONDS = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", 30))
+
+
+def verify_signature(secret, body, signature_header):
+    """Checks GitHub's X-Hub-Signature-256 header (HMAC-SHA256 of the raw body)."""
+    if not secret or not signature_header or not signature_header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature_header[len("sha256="):])
+
+def sign(secret, body):
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def parse_push(payload):
+    """
+    Pulls what the agent needs out of a push payload.
+    Returns None for pushes that can never need a run (other branches, deletions).
+    """
+    repository = payload.get("repository") or {}
+    repo_name = repository.get("full_name")
+    default_branch = repository.get("default_branch") or repository.get("master_branch")
+    if not repo_name or payload.get("deleted") or payload.get("ref") != f"refs/heads/{default_branch}":
+        return None
+
+    commits = payload.get("commits") or []
+    filenames = set()
+    for commit in commits:
+        for key in ("added", "modified", "removed"):
+            filenames.update(commit.get(key) or [])
+
+    return {
+        "repo": repo_name,
+        "sha": payload.get("after"),
+        "messages": [c.get("message", "") for c in commits],
+        "files": sorted(filenames),
+    }
+
+
+class PushDispatcher:
+    """
+    Collapses bursts of pushes per repo and feeds one run per burst into the
+    scheduler's bounded queue. All methods run on the event loop thread.
+    """
+
+    def __init__(self, state, queue, pending, debounce=DEBOUNCE_SECONDS):
+        self.state = state
+        self.queue = queue
+        self.pending = pending
+        self.debounce = debounce
+        self._latest = {}      # repo -> newest pushed sha not yet queued
+        self._skip_only = set()  # repos whose waiting sha only needs the state moved, not a run
+        self._queued = {}      # repo -> sha of the run this dispatcher queued last
+        self._timers = {}
+
+    def push(self, push):
+        repo_name = push["repo"]
+        if self.state.get(repo_name) == push["sha"]:
+            print(f"[{repo_name}] Already processed @ {push['sha'][:7]}")
+            return
+
+        reason = github_utils.ignore_reason(push["messages"], push["files"])
+        if reason and repo_name not in self._latest:
+            if repo_name not in self.pending:
+                print(f"[{repo_name}] Push ignored ({reason}) @ {push['sha'][:7]}")
+                asyncio.ensure_future(self.state.set(repo_name, push["sha"]))
+                return
+            # A run is in flight and will store its (older) head when it finishes, so
+            # moving the state now would be undone: wait for the run, then decide in _fire.
+            print(f"[{repo_name}] Push ignored ({reason}) @ {push['sha'][:7]}; recorded after the current run")
+            self._skip_only.add(repo_name)
+        elif not reason:
+            self._skip_only.discard(repo_name)
+
+        # A skippable push on top of real pending changes still moves the run to the newest head.
+        self._latest[repo_name] = push["sha"]
+        self._arm(repo_name)
+        if repo_name not in self._skip_only:
+            print(f"[{repo_name}] Push received @ {push['sha'][:7]} (run in {self.debounce:.0f}s unless more arrive)")
+
+    def _arm(self, repo_name):
+        loop = asyncio.get_running_loop()
+        if repo_name in self._timers:
+            self._timers[repo_name].cancel()
+        self._timers[repo_name] = loop.call_later(self.debounce, self._fire, repo_name)
+
+    def _fire(self, repo_name):
+        self._timers.pop(repo_name, None)
+        if repo_name in self.pending:
+            # A run is queued or in flight: try again once it has had time to finish.
+            self._arm(repo_name)
+            return
+        sha = self._latest[repo_name]
+        if repo_name in self._skip_only and self.state.get(repo_name) == self._queued.get(repo_name):
+            # The run before these pushes went through; only docs/skip-ci commits are left.
+            del self._latest[repo_name]
+            self._skip_only.discard(repo_name)
+            asyncio.ensure_future(self.state.set(repo_name, sha))
+            print(f"[{repo_name}] Memory moved past ignored pushes @ {sha[:7]}")
+            return
+        # Otherwise (or if that run failed) run up to the newest head, which covers both.
+        try:
+            self.queue.put_nowait((repo_name, sha, None))
+        except asyncio.QueueFull:
+            print(f"[{repo_name}] Run queue full. Retrying later...")
+            self._arm(repo_name)
+            return
+        del self._latest[repo_name]
+        self._skip_only.discard(repo_name)
+        self._queued[repo_name] = sha
+        self.pending.add(repo_name)
+        print(f"[{repo_name}] Queued agent run @ {sha[:7]}")
+
+
+def make_handler(secret, loop, dispatcher):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not verify_signature(secret, body, self.headers.get("X-Hub-Signature-256")):
+                return self._reply(401, "bad signature")
+
+            event = self.headers.get("X-GitHub-Event", "")
+            if event == "ping":
+                return self._reply(200, "pong")
+            if event != "push":
+                return self._reply(202, f"ignored event: {event}")
+
+            try:
+                push = parse_push(json.loads(body))
+            except (ValueError, AttributeError):
+                return self._reply(400, "invalid payload")
+            if push is None:
+                return self._reply(202, "ignored push")
+
+            loop.call_soon_threadsafe(dispatcher.push, push)
+            self._reply(202, "accepted")
+
+        def _reply(self, status, message):
+            data = message.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+async def dry_run_worker(queue, pending):
+    """Stands in for the agent workers when testing with recorded payloads."""
+    while True:
+        repo_name, sha, _ = await queue.get()
+        print(f"   [dry-run] Would run agent for {repo_name} @ {sha[:7]}")
+        pending.discard(repo_name)
+        queue.task_done()
+
+async def serve(host=WEBHOOK_HOST, port=WEBHOOK_PORT, dry_run=False):
+    print("---Living Documentation Webhook Receiver ---")
+
+    secret = os.getenv("GITHUB_WEBHOOK_SECRET")
+    if not secret: return print("❌ Error: GITHUB_WEBHOOK_SECRET missing.")
+
+    queue = asyncio.Queue(maxsize=scheduler.MAX_QUEUED_RUNS)
+    pending = set()
+    state = scheduler.StateStore()
+
+    if dry_run:
+        workers = [asyncio.create_task(dry_run_worker(queue, pending))]
+    else:
+        token = os.getenv("GITHUB_TOKEN")
+        if not token: return print("❌ Error: GITHUB_TOKEN missing.")
+        try:
+            g = github_utils.connect_to_github(token)
+        except Exception as e:
+            return print(f"❌ Connection Failed: {e}")
+        workers = [
+            asyncio.create_task(scheduler.agent_worker(i, g, state, queue, pending))
+            for i in range(scheduler.MAX_CONCURRENT_RUNS)
+        ]
+
+    dispatcher = PushDispatcher(state, queue, pending)
+    server = ThreadingHTTPServer((host, port), make_handler(secret, asyncio.get_running_loop(), dispatcher))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"Listening on http://{host}:{server.server_port}/ (debounce {DEBOUNCE_SECONDS:.0f}s{', dry run' if dry_run else ''})")
+    print("---------------------------------------------------")
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        server.shutdown()
+
+def replay(path, url, event="push"):
+    """Posts a recorded payload, signed with GITHUB_WEBHOOK_SECRET, to a running receiver."""
+    with open(path, "rb") as f:
+        body = f.read()
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-GitHub-Event": event,
+        "X-Hub-Signature-256": sign(os.getenv("GITHUB_WEBHOOK_SECRET", ""), body),
+    })
+    try:
+        with urllib.request.urlopen(request) as response:
+            print(f"{response.status}: {response.read().decode()}")
+    except urllib.error.HTTPError as e:
+        print(f"{e.code}: {e.read().decode()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GitHub push webhook receiver for the Living Document agent.")
+    parser.add_argument("--host", default=WEBHOOK_HOST)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--dry-run", action="store_true", help="log runs instead of starting the agent")
+    parser.add_argument("--replay", metavar="PAYLOAD.json", help="post a recorded payload to a running receiver")
+    parser.add_argument("--event", default="push", help="X-GitHub-Event header for --replay")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(args.replay, f"http://{args.host}:{args.port}/", args.event)
+    else:
+        try:
+            asyncio.run(serve(args.host, args.port, args.dry_run))
+        except KeyboardInterrupt:
+            print("\n🛑 Webhook receiver stopped by user.")